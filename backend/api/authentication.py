@@ -0,0 +1,38 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+
+def get_token_cache_key(key):
+    """Ключ кэша по хэшу токена, сам токен в кэш не попадает."""
+
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Авторизация по токену с кэшированием пары (пользователь, токен).
+    Запрос к authtoken_token и users_user выполняется только при
+    промахе кэша. Запись удаляется сигналами при удалении токена
+    (выход из системы) и при сохранении пользователя (смена пароля,
+    is_active, профиля); изменения через QuerySet.update() сигналов
+    не отправляют и вступают в силу через TOKEN_CACHE_TIMEOUT секунд.
+    Кэш должен быть общим для всех процессов, иначе удаление записи
+    видит только один из них; при TOKEN_CACHE_TIMEOUT = 0 токен
+    проверяется по базе в каждом запросе.
+    """
+
+    def authenticate_credentials(self, key):
+        if not settings.TOKEN_CACHE_TIMEOUT:
+            return super().authenticate_credentials(key)
+
+        cache_key = get_token_cache_key(key)
+        credentials = cache.get(cache_key)
+
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            cache.set(cache_key, credentials, settings.TOKEN_CACHE_TIMEOUT)
+
+        return credentials
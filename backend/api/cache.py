@@ -0,0 +1,111 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .metrics import registry
+
+INGREDIENTS_NAMESPACE = 'ingredients'
+RECIPES_NAMESPACE = 'recipes'
+TAGS_NAMESPACE = 'tags'
+
+
+def get_version(namespace):
+    """
+    Текущая версия пространства имён кэша.
+    Версия - время последнего изменения данных в наносекундах.
+    Ключи кэша включают версию, поэтому для инвалидации достаточно
+    сменить версию, не удаляя записи по шаблону.
+    """
+
+    key = f'version:{namespace}'
+    version = cache.get(key)
+
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        return cache.get(key)
+
+    return version
+
+
+def bump_version(namespace):
+    """Инвалидация всех записей пространства имён."""
+
+    cache.set(f'version:{namespace}', time.time_ns(), None)
+
+
+def make_key(*parts):
+    digest = hashlib.md5(
+        '|'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+
+    return f'response:{digest}'
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Кэширование ответов list/retrieve для анонимных пользователей.
+    Attributes:
+        cache_namespace: - пространство имён, версию которого
+        сбрасывают сигналы при изменении данных
+        cache_query_params: - параметры запроса, входящие в ключ;
+        запросы с любыми другими параметрами не кэшируются
+    """
+
+    cache_namespace = None
+    cache_query_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_response_cache_key(self, request):
+        if not request.user.is_anonymous:
+            return None
+
+        if set(request.query_params) - set(self.cache_query_params):
+            return None
+
+        params = sorted(
+            (name, sorted(request.query_params.getlist(name)))
+            for name in request.query_params
+        )
+
+        return make_key(
+            self.cache_namespace,
+            get_version(self.cache_namespace),
+            self.action,
+            request.build_absolute_uri(request.path),
+            params,
+        )
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+
+        if key is None:
+            return handler(request, *args, **kwargs)
+
+        data = cache.get(key)
+        registry.inc(
+            'foodgram_response_cache_total',
+            namespace=self.cache_namespace,
+            result='miss' if data is None else 'hit',
+        )
+
+        if data is not None:
+            return Response(data)
+
+        response = handler(request, *args, **kwargs)
+
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+
+        return response
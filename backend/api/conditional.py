@@ -0,0 +1,92 @@
+import hashlib
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers, quote_etag)
+from django.utils.http import http_date
+
+from .cache import get_version
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(
+        '|'.join(str(part) for part in parts).encode()
+    ).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    ETag и Last-Modified для list/retrieve.
+    Состояние ресурса определяется версиями пространств имён кэша,
+    которые сбрасывают сигналы, поэтому проверка If-None-Match /
+    If-Modified-Since не обращается к базе, а неизменённый ресурс
+    отдаётся ответом 304 без сериализации. Ответы помечаются
+    Cache-Control: no-cache, чтобы браузер проверял их при каждом
+    обращении, а не считал свежими по эвристике.
+    Attributes:
+        conditional_namespaces: - пространства имён, от версий
+        которых зависит ответ
+        conditional_actions: - действия с условными ответами
+    """
+
+    conditional_namespaces = ()
+    conditional_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        """
+        Пара (etag, last_modified) текущего состояния ответа.
+        last_modified - время последнего изменения в секундах или None,
+        etag равен None, если состояние определить нельзя.
+        """
+
+        versions = [
+            get_version(namespace)
+            for namespace in self.conditional_namespaces
+        ]
+
+        return (
+            make_etag(self.action, request.accepted_renderer.format,
+                      *versions),
+            max(versions) // 10 ** 9,
+        )
+
+    def get_conditional(self, handler, request, *args, **kwargs):
+        if self.action not in self.conditional_actions:
+            return handler(request, *args, **kwargs)
+
+        etag, last_modified = self.get_conditional_state(
+            request, *args, **kwargs
+        )
+
+        if etag is None:
+            return handler(request, *args, **kwargs)
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+
+        if response is None:
+            response = handler(request, *args, **kwargs)
+
+            if response.status_code != 200:
+                return response
+
+        response['ETag'] = etag
+
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+
+        if not request.user.is_anonymous:
+            patch_cache_control(response, private=True)
+
+        return response
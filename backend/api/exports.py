@@ -0,0 +1,128 @@
+import csv
+import io
+import os
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.negotiation import DefaultContentNegotiation
+
+FILENAME = 'foodgram_shopping_cart'
+
+EXPORTERS = {}
+
+
+def register(format):
+    """Регистрация формата выгрузки списка покупок."""
+
+    def decorator(exporter_class):
+        EXPORTERS[format] = exporter_class()
+        return exporter_class
+
+    return decorator
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """
+    Согласование содержимого без учёта параметра ?format=.
+    Параметр выбирает формат выгрузки, а не рендерер DRF.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class Echo:
+    """Псевдофайл, возвращающий записанную строку вместо хранения."""
+
+    def write(self, value):
+        return value
+
+
+@register('txt')
+class TextExporter:
+    """
+    Выгрузка в текстовый файл.
+    Attributes:
+        content_type: - MIME-тип ответа
+        extension: - расширение имени файла
+    """
+
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def render(self, items):
+        for item in items:
+            yield f"{item['name']} ({item['units']}) - {item['total']}\n"
+
+
+@register('csv')
+class CsvExporter:
+    """Выгрузка в csv-файл, BOM нужен Excel для кириллицы."""
+
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def render(self, items):
+        writer = csv.writer(Echo())
+        yield '\ufeff' + writer.writerow(
+            ('Ингредиент', 'Единицы измерения', 'Количество')
+        )
+
+        for item in items:
+            yield writer.writerow(
+                (item['name'], item['units'], item['total'])
+            )
+
+
+@register('pdf')
+class PdfExporter:
+    """
+    Выгрузка в pdf-файл.
+    Формат pdf требует таблицу смещений в конце файла, поэтому документ
+    собирается целиком и отдаётся одним блоком. Шрифт с кириллицей
+    берётся из settings.PDF_FONT_PATH.
+    """
+
+    content_type = 'application/pdf'
+    extension = 'pdf'
+    font_size = 12
+    margin = 50
+
+    def get_font(self):
+        if not os.path.exists(settings.PDF_FONT_PATH):
+            return 'Helvetica'
+
+        if 'ShoppingCart' not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont('ShoppingCart', settings.PDF_FONT_PATH)
+            )
+
+        return 'ShoppingCart'
+
+    def render(self, items):
+        buffer = io.BytesIO()
+        document = canvas.Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        _, height = A4
+        line_height = self.font_size * 1.5
+        y = height - self.margin
+        document.setFont(font, self.font_size)
+
+        for item in items:
+            if y < self.margin:
+                document.showPage()
+                document.setFont(font, self.font_size)
+                y = height - self.margin
+
+            document.drawString(
+                self.margin,
+                y,
+                f"{item['name']} ({item['units']}) - {item['total']}"
+            )
+            y -= line_height
+
+        document.save()
+        yield buffer.getvalue()
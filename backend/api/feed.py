@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import RECIPES_NAMESPACE, get_version
+from .relations import get_relations, get_relations_namespace
+from recipes.models import Recipe
+
+
+def get_timeline(user):
+    """
+    Объединённая лента подписок пользователя: пары (pub_date, id)
+    последних settings.FEED_TIMELINE_SIZE рецептов его авторов.
+    Строится одним запросом и хранится в кэше; ключ включает версии
+    подписок пользователя и рецептов, поэтому новая подписка или
+    новый рецепт дают новую ленту.
+    """
+
+    namespace = get_relations_namespace('following', user.pk)
+    key = 'feed:{}:{}:{}'.format(
+        user.pk, get_version(namespace), get_version(RECIPES_NAMESPACE)
+    )
+    timeline = cache.get(key)
+
+    if timeline is None:
+        timeline = list(
+            Recipe.objects.filter(
+                author__idol__user=user
+            ).order_by('-pub_date', '-id').values_list(
+                'pub_date', 'id'
+            )[:settings.FEED_TIMELINE_SIZE]
+        )
+        cache.set(key, timeline, settings.FEED_TIMELINE_TIMEOUT)
+
+    return timeline
+
+
+def get_timeline_ids(timeline, cursor, count):
+    """
+    id не более count рецептов ленты после курсора (pub_date, id).
+    None, если лента обрезана по FEED_TIMELINE_SIZE и рецептов
+    после курсора в ней не хватает на страницу.
+    """
+
+    start = 0
+
+    if cursor is not None:
+        cursor = tuple(cursor)
+        start = next(
+            (
+                position for position, entry in enumerate(timeline)
+                if tuple(entry) < cursor
+            ),
+            len(timeline),
+        )
+
+    ids = [pk for _, pk in timeline[start:start + count]]
+
+    if len(ids) < count and len(timeline) >= settings.FEED_TIMELINE_SIZE:
+        return None
+
+    return ids
+
+
+def filter_feed(queryset, request, pagination):
+    """
+    Рецепты авторов, на которых подписан пользователь запроса.
+    Пока подписок меньше settings.FEED_TIMELINE_THRESHOLD, это
+    условие author_id IN (...) по набору подписок из UserRelations,
+    которое использует индекс recipe_author_pub_date. При большем
+    числе подписок страница выбирается по объединённой ленте
+    из get_timeline, и запрос к рецептам идёт по первичному ключу.
+    """
+
+    following = get_relations(request).get('following')
+
+    if len(following) < settings.FEED_TIMELINE_THRESHOLD:
+        return queryset.filter(author_id__in=following)
+
+    cursor = request.query_params.get(pagination.cursor_query_param)
+    ids = get_timeline_ids(
+        get_timeline(request.user),
+        pagination.decode_cursor(cursor, queryset) if cursor else None,
+        pagination.get_page_size(request) + 1,
+    )
+
+    if ids is None:
+        return queryset.filter(author__idol__user=request.user)
+
+    return queryset.filter(pk__in=ids)
@@ -1,11 +1,19 @@
 from django.db import models
-from django_filters import CharFilter, rest_framework
+from django_filters import CharFilter, ChoiceFilter, rest_framework
 
-from recipes.models import Ingredient, Recipe
+from .search import search_recipes, search_similar_ingredients
+from recipes.models import Ingredient, Recipe, Tag
+
+# Сортировка ?ordering=popular, совпадает с индексом recipe_popularity_id.
+POPULAR_ORDERING = ('-popularity', '-id')
 
 
 class IngredientFilter(rest_framework.FilterSet):
-    """Фильтр ингредиентов."""
+    """
+    Фильтр ингредиентов.
+    Если ни одно название не содержит value, ищутся похожие названия:
+    так запрос с опечаткой не приходится повторять.
+    """
 
     name = CharFilter(method='filtering_by_name')
 
@@ -22,7 +30,12 @@ class IngredientFilter(rest_framework.FilterSet):
             .annotate(qs_order=models.Value(1, models.IntegerField()))
         )
 
-        return starts_with.union(contains).order_by('qs_order')
+        matches = starts_with.union(contains).order_by('qs_order')
+
+        if matches.exists():
+            return matches
+
+        return search_similar_ingredients(queryset, value)
 
     class Meta:
         model = Ingredient
@@ -30,9 +43,17 @@ class IngredientFilter(rest_framework.FilterSet):
 
 
 class RecipeFilter(rest_framework.FilterSet):
-    """Фильтр рецептов."""
-    tags = rest_framework.AllValuesMultipleFilter(
-        field_name='tags__slug'
+    """
+    Фильтр рецептов.
+    ordering=popular сортирует по Recipe.popularity, которую
+    пересчитывает команда refresh_popularity; без параметра рецепты
+    идут от новых к старым.
+    """
+    search = CharFilter(method='search_by_text')
+    tags = rest_framework.ModelMultipleChoiceFilter(
+        field_name='tags__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all(),
     )
     is_favorited = rest_framework.BooleanFilter(
         method='get_is_favorited',
@@ -40,6 +61,15 @@ class RecipeFilter(rest_framework.FilterSet):
     is_in_shopping_cart = rest_framework.BooleanFilter(
         method='get_is_in_shopping_cart',
     )
+    ordering = ChoiceFilter(
+        choices=(('new', 'Новые'), ('popular', 'Популярные')),
+        method='order_recipes',
+    )
+
+    def search_by_text(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
 
     def get_is_favorited(self, queryset, name, value):
         if value:
@@ -51,6 +81,14 @@ class RecipeFilter(rest_framework.FilterSet):
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
 
+    def order_recipes(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.order_by(*POPULAR_ORDERING)
+        return queryset
+
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+            'search', 'ordering',
+        )
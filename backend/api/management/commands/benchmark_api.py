@@ -0,0 +1,365 @@
+import base64
+import io
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.cache import INGREDIENTS_NAMESPACE, RECIPES_NAMESPACE, bump_version
+from recipes.images import executor
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
+                            Recipe, ShoppingCart, Tag)
+from users.models import Subscription, User
+
+# Количество запросов к базе не должно зависеть от объёма данных,
+# поэтому бюджеты по запросам заданы по умолчанию. Они считают токен
+# после первого запроса взятым из кэша, как при общем кэше в продакшене,
+# поэтому бенчмарк включает TOKEN_CACHE_TIMEOUT сам. Бюджеты времени
+# и памяти зависят от машины и задаются файлом --budgets.
+DEFAULT_BUDGETS = {
+    'recipes_list': {'queries': 5},
+    'recipes_filter_tags': {'queries': 6},
+    'recipes_popular': {'queries': 5},
+    'recipes_list_anonymous': {'queries': 0},
+    'recipes_detail': {'queries': 5},
+    'recipes_create': {'queries': 17},
+    'ingredients_search': {'queries': 0},
+    'subscriptions': {'queries': 3},
+    'subscriptions_feed': {'queries': 4},
+    'download_shopping_cart': {'queries': 1},
+}
+
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[round(share * (len(values) - 1))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер API на синтетических данных: количество '
+        'запросов к базе, p50/p95 времени ответа и пик памяти по каждой '
+        'точке. Данные создаются в отдельной тестовой базе (SQLite или '
+        'PostgreSQL из настроек), команда завершается ошибкой, если '
+        'замер превышает бюджет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Избранных рецептов на пользователя.',
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Рецептов в корзине на пользователя.',
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Подписок на пользователя.',
+        )
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--budgets',
+            help='json-файл с бюджетами {точка: {queries, p95_ms, '
+                 'memory_kb}}, дополняет бюджеты по умолчанию.',
+        )
+        parser.add_argument(
+            '--output', help='Сохранить результаты в json-файл.',
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Не удалять тестовую базу после замера.',
+        )
+
+    def handle(self, *args, **options):
+        budgets = self.load_budgets(options['budgets'])
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False,
+            keepdb=options['keepdb'],
+        )
+
+        try:
+            with tempfile.TemporaryDirectory() as media_root, (
+                override_settings(
+                    CACHES=BENCHMARK_CACHES,
+                    MEDIA_ROOT=media_root,
+                    TOKEN_CACHE_TIMEOUT=300,
+                )
+            ):
+                bump_version(RECIPES_NAMESPACE)
+                bump_version(INGREDIENTS_NAMESPACE)
+                self.seed(random.Random(options['seed']), options)
+                results = {
+                    name: self.measure(request, options['iterations'])
+                    for name, request in self.get_endpoints().items()
+                }
+                executor.shutdown(wait=True)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+            teardown_test_environment()
+
+        self.report(results)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+
+        failures = self.check_budgets(results, budgets)
+
+        if failures:
+            raise CommandError(
+                'Превышены бюджеты:\n' + '\n'.join(failures)
+            )
+
+        self.stdout.write(self.style.SUCCESS('Все бюджеты соблюдены.'))
+
+    def load_budgets(self, path):
+        budgets = {name: dict(budget) for name, budget in
+                   DEFAULT_BUDGETS.items()}
+
+        if path:
+            with open(path, encoding='utf-8') as budgets_file:
+                for name, budget in json.load(budgets_file).items():
+                    budgets.setdefault(name, {}).update(budget)
+
+        return budgets
+
+    def seed(self, rnd, options):
+        """Синтетические данные, воспроизводимые при том же --seed."""
+
+        started = time.monotonic()
+        password = make_password('benchmark-password')
+        User.objects.bulk_create(
+            User(
+                email=f'user{number}@benchmark.local',
+                username=f'user{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            )
+            for number in range(options['users'])
+        )
+        users = list(User.objects.order_by('pk'))
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}')
+            for number in range(3)
+        )
+        tags = list(Tag.objects.order_by('pk'))
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(options['ingredients'])
+        )
+        ingredients = list(Ingredient.objects.order_by('pk'))
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=rnd.choice(users),
+                name=f'Рецепт {number}',
+                text='Описание рецепта ' * 20,
+                cooking_time=rnd.randint(1, 120),
+            )
+            for number in range(options['recipes'])
+        )
+        # SQLite не возвращает id из bulk_create, объекты читаются заново.
+        recipes = list(Recipe.objects.order_by('pk'))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in rnd.sample(tags, 2)
+        )
+        IngredientAmount.objects.bulk_create(
+            (
+                IngredientAmount(
+                    recipe=recipe, ingredient=ingredient,
+                    amount=rnd.randint(1, 500),
+                )
+                for recipe in recipes
+                for ingredient in rnd.sample(
+                    ingredients, options['ingredients_per_recipe']
+                )
+            ),
+            batch_size=1000,
+        )
+
+        for model, count in (
+            (FavoriteRecipe, options['favorites']),
+            (ShoppingCart, options['carts']),
+        ):
+            model.objects.bulk_create(
+                (
+                    model(user=user, recipe=recipe)
+                    for user in users
+                    for recipe in rnd.sample(recipes, count)
+                ),
+                batch_size=1000,
+            )
+
+        Subscription.objects.bulk_create(
+            (
+                Subscription(user=user, author=author)
+                for user in users
+                for author in rnd.sample(users, options['subscriptions'] + 1)
+                if author != user
+            ),
+            batch_size=1000,
+        )
+        call_command('rebuild_cart_totals', stdout=io.StringIO())
+        call_command('rebuild_counters', stdout=io.StringIO())
+        call_command('refresh_popularity', stdout=io.StringIO())
+
+        self.user = users[0]
+        self.tags = tags
+        self.ingredients = ingredients
+        self.recipe = recipes[-1]
+        self.stdout.write(
+            f'Данные созданы за {time.monotonic() - started:.1f} с'
+        )
+
+    def get_endpoints(self):
+        anonymous = APIClient()
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION='Token ' + Token.objects.create(
+                user=self.user
+            ).key
+        )
+        image = io.BytesIO()
+        Image.new('RGB', (64, 64), 'white').save(image, 'PNG')
+        recipe = {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'tags': [tag.pk for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 10}
+                for ingredient in self.ingredients[:8]
+            ],
+            'image': 'data:image/png;base64,'
+                     + base64.b64encode(image.getvalue()).decode(),
+        }
+
+        return {
+            'recipes_list': lambda: client.get(
+                '/api/recipes/', {'limit': 20}
+            ),
+            'recipes_filter_tags': lambda: client.get(
+                '/api/recipes/', {'tags': [tag.slug for tag in self.tags[:2]]}
+            ),
+            'recipes_popular': lambda: client.get(
+                '/api/recipes/', {'ordering': 'popular', 'limit': 20}
+            ),
+            'recipes_list_anonymous': lambda: anonymous.get('/api/recipes/'),
+            'recipes_detail': lambda: client.get(
+                f'/api/recipes/{self.recipe.pk}/'
+            ),
+            'recipes_create': lambda: client.post(
+                '/api/recipes/', recipe, format='json'
+            ),
+            'ingredients_search': lambda: client.get(
+                '/api/ingredients/', {'name': 'ингредиент 1'}
+            ),
+            'subscriptions': lambda: client.get(
+                '/api/users/subscriptions/', {'recipe_limit': 3}
+            ),
+            'subscriptions_feed': lambda: client.get(
+                '/api/recipes/feed/', {'limit': 20}
+            ),
+            'download_shopping_cart': lambda: client.get(
+                '/api/recipes/download_shopping_cart/'
+            ),
+        }
+
+    def request(self, send):
+        response = send()
+
+        if response.status_code >= 400:
+            raise CommandError(
+                f'Ответ {response.status_code}: {response.content[:200]}'
+            )
+
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+        return response
+
+    def measure(self, send, iterations):
+        """
+        Замер одной точки: прогревочный запрос, iterations запросов
+        для времени и числа запросов к базе, затем отдельный запрос
+        под tracemalloc, который сам замедляет выполнение.
+        """
+
+        self.request(send)
+        timings = []
+        queries = []
+
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                self.request(send)
+                timings.append((time.perf_counter() - started) * 1000)
+
+            queries.append(len(context.captured_queries))
+
+        tracemalloc.start()
+
+        try:
+            self.request(send)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'queries': max(queries),
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'memory_kb': round(peak / 1024, 1),
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"точка":<26}{"запросы":>8}{"p50, мс":>10}'
+            f'{"p95, мс":>10}{"память, Кб":>12}'
+        )
+
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<26}{result["queries"]:>8}{result["p50_ms"]:>10}'
+                f'{result["p95_ms"]:>10}{result["memory_kb"]:>12}'
+            )
+
+    def check_budgets(self, results, budgets):
+        return [
+            f'{name}: {metric} = {results[name][metric]}, бюджет {limit}'
+            for name, budget in budgets.items() if name in results
+            for metric, limit in budget.items()
+            if results[name][metric] > limit
+        ]
@@ -0,0 +1,174 @@
+import re
+from types import SimpleNamespace
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from api.feed import filter_feed
+from api.filters import RecipeFilter
+from api.paginations import KeysetPagination
+from api.relations import get_relations
+from recipes.models import (FavoriteRecipe, Recipe, ShoppingCartIngredient,
+                            Tag)
+from users.models import User
+
+INDEX_PATTERNS = (
+    re.compile(r'Index (?:Only )?Scan (?:Backward )?using (\w+)'),
+    re.compile(r'Bitmap Index Scan on (\w+)'),
+    re.compile(r'USING (?:COVERING )?INDEX (\w+)'),
+)
+FULL_SCAN_PATTERNS = (
+    re.compile(r'Seq Scan on (\w+)'),
+    re.compile(r'\bSCAN (?:TABLE )?(\w+)(?! USING)(?:\s|$)'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Планы выполнения (EXPLAIN) основных запросов API и индексы, '
+        'которые они используют. Планировщик выбирает индексы по '
+        'статистике, поэтому запускать стоит на базе с реальным '
+        'объёмом данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email пользователя для персональных запросов.',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='EXPLAIN ANALYZE с реальным временем (только PostgreSQL).',
+        )
+        parser.add_argument(
+            '--plans',
+            action='store_true',
+            help='Выводить планы целиком, а не только индексы.',
+        )
+
+    def handle(self, *args, **options):
+        if options['analyze'] and connection.vendor != 'postgresql':
+            raise CommandError('--analyze поддерживается только PostgreSQL.')
+
+        user = self.get_user(options['user'])
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        full_scans = 0
+
+        for title, queryset in self.get_queries(user):
+            plan = queryset.explain(**explain_options)
+            indexes = self.find(INDEX_PATTERNS, plan)
+            scans = self.find(FULL_SCAN_PATTERNS, plan)
+            full_scans += bool(scans)
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(f'  индексы: {", ".join(indexes) or "-"}')
+
+            if scans:
+                self.stdout.write(self.style.WARNING(
+                    f'  полное чтение: {", ".join(scans)}'
+                ))
+
+            if options['plans']:
+                self.stdout.write(plan)
+
+        self.stdout.write(
+            f'Запросов с полным чтением таблиц: {full_scans}'
+        )
+
+    def get_user(self, email):
+        users = User.objects.all()
+
+        if email:
+            users = users.filter(email=email)
+
+        user = users.filter(shopping_cart__isnull=False).first() or (
+            users.first()
+        )
+
+        if user is None:
+            raise CommandError('Нет пользователя для запросов.')
+
+        return user
+
+    def filter_recipes(self, user, **params):
+        return RecipeFilter(
+            params,
+            queryset=Recipe.objects.annotate_user_flags(user),
+            request=SimpleNamespace(user=user),
+        ).qs
+
+    def get_queries(self, user):
+        """Запросы в том виде, в котором их строят вьюсеты."""
+
+        recipes = Recipe.objects.annotate_user_flags(user)
+        tag = Tag.objects.first()
+        last = Recipe.objects.order_by('-pub_date', '-id').first()
+        pagination = KeysetPagination()
+        queries = [
+            ('Рецепты: первая страница', recipes[:6]),
+            ('Рецепты: страница 100', recipes[600:606]),
+            (
+                'Рецепты: популярные',
+                self.filter_recipes(user, ordering='popular')[:6],
+            ),
+            (
+                'Рецепты автора',
+                self.filter_recipes(user, author=user.pk)[:6],
+            ),
+            (
+                'Рецепты: избранное',
+                self.filter_recipes(user, is_favorited='true')[:6],
+            ),
+            (
+                'Рецепты: корзина',
+                self.filter_recipes(user, is_in_shopping_cart='true')[:6],
+            ),
+            (
+                'Рецепт в избранном',
+                FavoriteRecipe.objects.filter(
+                    user=user, recipe_id=getattr(last, 'pk', 0)
+                ),
+            ),
+            (
+                'Подписки',
+                User.objects.filter(idol__user=user).order_by('-id')[:6],
+            ),
+            (
+                'Список покупок',
+                ShoppingCartIngredient.objects.filter(
+                    user=user
+                ).order_by('-amount'),
+            ),
+        ]
+
+        request = SimpleNamespace(user=user, query_params={})
+
+        if get_relations(request).get('following'):
+            # Без подписок лента пуста и запрос к базе не выполняется.
+            queries.append((
+                'Рецепты подписок',
+                filter_feed(recipes, request, pagination).order_by(
+                    *pagination.ordering
+                )[:pagination.page_size + 1],
+            ))
+
+        if last is not None:
+            queries.append((
+                'Рецепты: курсор',
+                recipes.order_by(*pagination.ordering).filter(
+                    pagination.get_cursor_filter([last.pub_date, last.pk])
+                )[:pagination.page_size + 1],
+            ))
+
+        if tag is not None:
+            queries.append((
+                'Рецепты по тегу',
+                self.filter_recipes(user, tags=[tag.slug])[:6],
+            ))
+
+        return queries
+
+    def find(self, patterns, plan):
+        return sorted({
+            name for pattern in patterns for name in pattern.findall(plan)
+        })
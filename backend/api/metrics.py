@@ -0,0 +1,321 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+METRICS = {
+    'foodgram_http_requests_total': (
+        'counter', 'Обработанные запросы по представлениям.'
+    ),
+    'foodgram_http_request_duration_seconds': (
+        'histogram', 'Время обработки запроса.'
+    ),
+    'foodgram_db_queries_total': (
+        'counter', 'SQL-запросы, выполненные при обработке запросов.'
+    ),
+    'foodgram_response_cache_total': (
+        'counter', 'Обращения к кэшу ответов: hit или miss.'
+    ),
+    'foodgram_requests_in_flight': (
+        'gauge', 'Запросы, обрабатываемые процессом сейчас.'
+    ),
+    'foodgram_worker_threads': (
+        'gauge', 'Потоков обработки запросов в процессе.'
+    ),
+}
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса без блокировки на каждый запрос.
+    Каждый поток пишет только в свои словари, блокировка берётся один
+    раз при первом обращении потока, чтобы зарегистрировать их.
+    При выдаче метрик словари всех потоков копируются и суммируются.
+    Словари завершившихся потоков при регистрации нового потока
+    и при выдаче переносятся в общий итог retired, поэтому список
+    не растёт, когда сервер создаёт поток на каждый запрос.
+    Если задан settings.METRICS_DIR (несколько воркеров gunicorn),
+    процесс не чаще раза в settings.METRICS_FLUSH_INTERVAL секунд
+    сохраняет свой срез в файл, а выдача суммирует срезы всех
+    процессов; счётчики завершившихся процессов сохраняются,
+    gauge учитываются только у живых.
+    Attributes:
+        stores: list - пары (поток, словари его метрик) живых потоков
+        retired: dict - сумма метрик завершившихся потоков
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.stores = []
+        self.retired = new_store()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flushed = 0
+
+    def get_store(self):
+        store = getattr(self.local, 'store', None)
+
+        if store is None:
+            store = new_store()
+
+            with self.lock:
+                self.retire_dead()
+                self.stores.append((threading.current_thread(), store))
+
+            self.local.store = store
+
+        return store
+
+    def retire_dead(self):
+        """
+        Перенос метрик завершившихся потоков в retired.
+        Вызывается под self.lock: завершившийся поток в свои словари
+        больше не пишет.
+        """
+
+        alive = []
+
+        for thread, store in self.stores:
+            if thread.is_alive():
+                alive.append((thread, store))
+            else:
+                merge_store(self.retired, store)
+
+        self.stores = alive
+
+    def inc(self, name, value=1, **labels):
+        counters = self.get_store()['counters']
+        key = (name, tuple(sorted(labels.items())))
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        histograms = self.get_store()['histograms']
+        key = (name, tuple(sorted(labels.items())))
+        histogram = histograms.get(key)
+
+        if histogram is None:
+            histogram = histograms[key] = [
+                [0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0
+            ]
+
+        histogram[0][bisect_left(LATENCY_BUCKETS, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    def snapshot(self):
+        """Сумма метрик всех потоков процесса."""
+
+        summary = new_store()
+
+        with self.lock:
+            self.retire_dead()
+            merge_store(summary, self.retired)
+            stores = [store for _, store in self.stores]
+
+        for store in stores:
+            merge_store(summary, store)
+
+        counters = summary['counters']
+        histograms = summary['histograms']
+        in_flight = (
+            counters.pop(('foodgram_requests_started', ()), 0)
+            - counters.pop(('foodgram_requests_finished', ()), 0)
+        )
+        pid = str(os.getpid())
+
+        return {
+            'counters': [
+                [name, labels, value]
+                for (name, labels), value in counters.items()
+            ],
+            'histograms': [
+                [name, labels, *histogram]
+                for (name, labels), histogram in histograms.items()
+            ],
+            'gauges': [
+                ['foodgram_requests_in_flight', [('pid', pid)], in_flight],
+                [
+                    'foodgram_worker_threads',
+                    [('pid', pid)],
+                    settings.METRICS_WORKER_THREADS,
+                ],
+            ],
+        }
+
+    def get_path(self, pid):
+        return os.path.join(settings.METRICS_DIR, f'metrics_{pid}.json')
+
+    def flush(self, force=False):
+        """Сохранение среза процесса для выдачи другими воркерами."""
+
+        if not settings.METRICS_DIR:
+            return
+
+        now = time.monotonic()
+
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+
+        if not self.flush_lock.acquire(blocking=False):
+            return
+
+        try:
+            self.flushed = now
+            path = self.get_path(os.getpid())
+
+            with open(f'{path}.tmp', 'w') as snapshot_file:
+                json.dump(self.snapshot(), snapshot_file)
+
+            os.replace(f'{path}.tmp', path)
+        finally:
+            self.flush_lock.release()
+
+    def collect(self):
+        """Срезы всех процессов: из файлов METRICS_DIR или свой."""
+
+        if not settings.METRICS_DIR:
+            return [self.snapshot()]
+
+        self.flush(force=True)
+        snapshots = []
+
+        for filename in os.listdir(settings.METRICS_DIR):
+            if not (
+                filename.startswith('metrics_')
+                and filename.endswith('.json')
+            ):
+                continue
+
+            pid = int(filename[len('metrics_'):-len('.json')])
+
+            try:
+                with open(self.get_path(pid)) as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+            except (OSError, ValueError):
+                continue
+
+            if not is_alive(pid):
+                snapshot['gauges'] = []
+
+            snapshots.append(snapshot)
+
+        return snapshots
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+
+        samples = defaultdict(list)
+
+        for snapshot in self.collect():
+            for name, labels, value in (
+                snapshot['counters'] + snapshot['gauges']
+            ):
+                samples[name].append((tuple(map(tuple, labels)), value))
+
+            for name, labels, buckets, total, count in (
+                snapshot['histograms']
+            ):
+                samples[name].append(
+                    (tuple(map(tuple, labels)), (buckets, total, count))
+                )
+
+        lines = []
+
+        for name, (kind, description) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+
+            if kind == 'histogram':
+                lines.extend(render_histogram(name, samples[name]))
+                continue
+
+            merged = defaultdict(float)
+
+            for labels, value in samples[name]:
+                merged[labels] += value
+
+            lines.extend(
+                f'{name}{format_labels(labels)} {value:g}'
+                for labels, value in sorted(merged.items())
+            )
+
+        return '\n'.join(lines) + '\n'
+
+
+def new_store():
+    return {'counters': {}, 'histograms': {}}
+
+
+def merge_store(target, store):
+    """Прибавление метрик store к target."""
+
+    counters = target['counters']
+
+    for key, value in store['counters'].copy().items():
+        counters[key] = counters.get(key, 0) + value
+
+    for key, (buckets, total, count) in store['histograms'].copy().items():
+        merged = target['histograms'].setdefault(
+            key, [[0] * len(buckets), 0.0, 0]
+        )
+        merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+        merged[1] += total
+        merged[2] += count
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+
+    values = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"'),
+        )
+        for name, value in labels
+    )
+
+    return f'{{{values}}}'
+
+
+def render_histogram(name, samples):
+    merged = {}
+
+    for labels, (buckets, total, count) in samples:
+        histogram = merged.setdefault(labels, [[0] * len(buckets), 0.0, 0])
+        histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+        histogram[1] += total
+        histogram[2] += count
+
+    for labels, (buckets, total, count) in sorted(merged.items()):
+        cumulative = 0
+
+        for bound, bucket in zip((*LATENCY_BUCKETS, '+Inf'), buckets):
+            cumulative += bucket
+            bucket_labels = (*labels, ('le', bound))
+            yield f'{name}_bucket{format_labels(bucket_labels)} {cumulative}'
+
+        yield f'{name}_sum{format_labels(labels)} {total:g}'
+        yield f'{name}_count{format_labels(labels)} {count}'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,259 @@
+import json
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry
+
+logger = logging.getLogger('api.profiling')
+
+
+class RequestProfile:
+    """
+    Замеры одного запроса.
+    Экземпляр подключается к соединениям с базой через execute_wrapper
+    и учитывает каждый выполненный SQL-запрос.
+    Attributes:
+        queries: int - количество SQL-запросов
+        db_time: float - суммарное время SQL-запросов, с
+        slowest: tuple - (время, SQL) самого долгого запроса
+        statements: Counter - сколько раз выполнялся каждый SQL-шаблон
+        marks: dict - отметки времени этапов обработки запроса
+        durations: defaultdict - суммарное время этапов, замеренных
+        через measure, с
+        active: set - этапы, замер которых идёт сейчас
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = (0.0, '')
+        self.statements = Counter()
+        self.marks = {'start': time.perf_counter()}
+        self.durations = defaultdict(float)
+        self.active = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += duration
+            self.statements[sql] += 1
+
+            if duration > self.slowest[0]:
+                self.slowest = (duration, sql)
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter()
+
+    @contextmanager
+    def measure(self, name):
+        """
+        Прибавление времени блока к этапу name. Вложенные замеры
+        того же этапа входят во внешний и не суммируются повторно.
+        """
+
+        if name in self.active:
+            yield
+            return
+
+        self.active.add(name)
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.durations[name] += time.perf_counter() - started
+            self.active.discard(name)
+
+    def elapsed(self, start, end):
+        if start not in self.marks or end not in self.marks:
+            return None
+
+        return (self.marks[end] - self.marks[start]) * 1000
+
+    def get_duplicates(self):
+        """SQL-шаблоны, выполненные не меньше порога раз: признак N+1."""
+
+        return [
+            {'sql': sql[:200], 'count': count}
+            for sql, count in self.statements.most_common()
+            if count >= settings.REQUEST_PROFILING_DUPLICATE_THRESHOLD
+        ]
+
+    def get_timings(self):
+        """
+        Этапы обработки запроса в миллисекундах:
+            db: - время SQL-запросов
+            db-slowest: - самый долгий SQL-запрос
+            view: - работа представления, включая SQL; для ответов
+            без рендеринга - до конца обработки запроса
+            view_non_sql: - view без времени SQL: авторизация,
+            права, фильтры, пагинация, сериализаторы и остальной
+            Python-код представления
+            serialize: - to_representation сериализаторов ответа,
+            включая SQL, который они выполняют; входит в view
+            render: - перевод ответа в json
+            total: - весь запрос, включая остальные middleware
+        """
+
+        view = self.elapsed(
+            'view', 'response' if 'response' in self.marks else 'end'
+        )
+        timings = {
+            'db': self.db_time * 1000,
+            'db-slowest': self.slowest[0] * 1000,
+            'view': view,
+            'view_non_sql': None if view is None else max(
+                view - self.db_time * 1000, 0
+            ),
+            'serialize': (
+                self.durations['serialize'] * 1000
+                if 'serialize' in self.durations else None
+            ),
+            'render': self.elapsed('response', 'rendered'),
+            'total': self.elapsed('start', 'end'),
+        }
+
+        return {
+            name: round(value, 2)
+            for name, value in timings.items() if value is not None
+        }
+
+
+class RequestProfilingMiddleware:
+    """
+    Замер стоимости запросов к API.
+    Для доли запросов settings.REQUEST_PROFILING_SAMPLE_RATE считает
+    количество и время SQL-запросов, время представления и рендеринга,
+    добавляет их в заголовок Server-Timing и пишет строку json в лог
+    api.profiling. Повторяющиеся SQL-шаблоны (N+1) попадают в лог
+    с уровнем WARNING. Запросы вне выборки не замеряются вовсе.
+    Потоковые ответы выдаются после middleware, поэтому SQL,
+    выполненный во время выдачи, не учитывается.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.REQUEST_PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        request.profile = profile
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+
+            response = self.get_response(request)
+
+        profile.mark('end')
+        timings = profile.get_timings()
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={value}' for name, value in timings.items()
+        ) + f', queries;desc="{profile.queries}"'
+        self.log(request, response, profile, timings)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, 'profile'):
+            request.profile.mark('view')
+
+    def process_template_response(self, request, response):
+        if hasattr(request, 'profile'):
+            profile = request.profile
+            profile.mark('response')
+            response.add_post_render_callback(
+                lambda response: profile.mark('rendered')
+            )
+
+        return response
+
+    def log(self, request, response, profile, timings):
+        duplicates = profile.get_duplicates()
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view_name': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': profile.queries,
+            'slowest_sql': profile.slowest[1][:200],
+            'duplicates': duplicates,
+            **timings,
+        }
+        logger.log(
+            logging.WARNING if duplicates else logging.INFO,
+            json.dumps(record, ensure_ascii=False)
+        )
+
+
+class QueryCounter:
+    """Счётчик SQL-запросов для execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Сбор метрик для /metrics/: количество и время запросов, число
+    SQL-запросов по представлениям и запросы в обработке. Метка view -
+    имя маршрута (например api:recipes-list, api:users-subscribe),
+    а не путь, чтобы число рядов не зависело от id в адресах.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        registry.inc('foodgram_requests_started')
+        started = time.perf_counter()
+        queries = QueryCounter()
+
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(queries))
+
+                response = self.get_response(request)
+        finally:
+            registry.inc('foodgram_requests_finished')
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        registry.inc(
+            'foodgram_http_requests_total',
+            view=view,
+            method=request.method,
+            status=response.status_code,
+        )
+        registry.observe(
+            'foodgram_http_request_duration_seconds',
+            time.perf_counter() - started,
+            view=view,
+            method=request.method,
+        )
+        registry.inc('foodgram_db_queries_total', queries.count, view=view)
+        registry.flush()
+
+        return response
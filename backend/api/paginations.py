@@ -1,7 +1,263 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CountStrategyPaginator(Paginator):
+    """
+    Paginator с выбором способа подсчёта count.
+    Способ задаётся настройкой PAGINATION_COUNT_STRATEGY:
+        exact: - точный COUNT(*) на каждый запрос
+        cached: - точный COUNT(*), сохранённый в кэше на
+        PAGINATION_COUNT_CACHE_TIMEOUT секунд по SQL-запросу
+        (то есть по фильтрам и пользователю); может отставать
+        от данных не дольше этого времени
+        estimate: - для списка без фильтров на PostgreSQL оценка
+        планировщика pg_class.reltuples, если она не меньше
+        PAGINATION_EXACT_COUNT_THRESHOLD; точность оценки - до
+        последнего ANALYZE/autovacuum таблицы; для остальных
+        запросов используется cached
+    При приблизительном count последняя страница может оказаться
+    неполной или пустой, ссылка next при этом остаётся корректной.
+    """
+
+    @cached_property
+    def count(self):
+        strategy = settings.PAGINATION_COUNT_STRATEGY
+
+        if strategy == 'estimate':
+            estimate = self.get_estimated_count()
+
+            if estimate is not None:
+                return estimate
+
+            strategy = 'cached'
+
+        if strategy == 'cached':
+            return self.get_cached_count()
+
+        return self.object_list.count()
+
+    def get_estimated_count(self):
+        queryset = self.object_list
+        query = queryset.query
+        connection = connections[queryset.db]
+
+        if (
+            connection.vendor != 'postgresql'
+            or query.where
+            or query.distinct
+            or query.is_sliced
+        ):
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+
+        if row is None or row[0] < settings.PAGINATION_EXACT_COUNT_THRESHOLD:
+            return None
+
+        return int(row[0])
+
+    def get_cached_count(self):
+        queryset = self.object_list
+
+        try:
+            sql = str(queryset.query)
+        except EmptyResultSet:
+            return 0
+
+        key = 'count:' + hashlib.md5(
+            f'{queryset.db}|{sql}'.encode()
+        ).hexdigest()
+        count = cache.get(key)
+
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+
+        return count
 
 
 class LimitPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с параметром limit.
+    Поле count ответа присутствует всегда, его точность зависит от
+    PAGINATION_COUNT_STRATEGY (см. CountStrategyPaginator).
+    """
+
     page_size = 6
     page_size_query_param = 'limit'
     max_page_size = 20
+    django_paginator_class = CountStrategyPaginator
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация.
+    Курсор хранит значения полей сортировки последнего объекта страницы,
+    следующая страница выбирается условием WHERE по этим значениям,
+    без OFFSET и COUNT(*). Стоимость страницы не зависит от её номера,
+    а новые объекты не сдвигают уже выданные страницы.
+    Attributes:
+        ordering: - поля сортировки по умолчанию, последнее поле должно
+        быть уникальным; вьюсет может задать свои в keyset_ordering
+    """
+
+    page_size = LimitPagination.page_size
+    page_size_query_param = LimitPagination.page_size_query_param
+    max_page_size = LimitPagination.max_page_size
+    cursor_query_param = 'cursor'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = getattr(view, 'keyset_ordering', self.ordering)
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+
+        if cursor:
+            queryset = queryset.filter(
+                self.get_cursor_filter(self.decode_cursor(cursor, queryset))
+            )
+
+        results = list(queryset[:page_size + 1])
+        self.next_values = None
+
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_values = [
+                getattr(results[-1], field.lstrip('-'))
+                for field in self.ordering
+            ]
+
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size < 1:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def get_cursor_filter(self, values):
+        """
+        Условие "строго после курсора" для составного ключа:
+        (a < x) OR (a = x AND b < y) OR ...
+        """
+
+        condition = Q()
+        equal = {}
+
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+
+        return condition
+
+    def encode_cursor(self, values):
+        data = json.dumps([
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in values
+        ])
+
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor, queryset):
+        """
+        Значения ключа из курсора. Курсор, который не декодируется,
+        не совпадает по длине с ordering или содержит null и другие
+        не скалярные значения, даёт 404.
+        """
+
+        fields = [
+            queryset.model._meta.get_field(field.lstrip('-'))
+            for field in self.ordering
+        ]
+
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+
+            values = [
+                field.to_python(value)
+                for field, value in zip(fields, values)
+                if isinstance(value, (str, int, float))
+                and not isinstance(value, bool)
+            ]
+
+            if len(values) != len(fields) or None in values:
+                raise ValueError
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return values
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_values),
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class KeysetPaginationMixin:
+    """
+    Переключение вьюсета на курсорную пагинацию.
+    Включается параметром ?pagination=cursor, без него используется
+    pagination_class вьюсета.
+    """
+
+    keyset_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            request = getattr(self, 'request', None)
+
+            if (
+                request is not None
+                and request.query_params.get('pagination') == 'cursor'
+            ):
+                self._paginator = self.keyset_pagination_class()
+            else:
+                self._paginator = super().paginator
+
+        return self._paginator
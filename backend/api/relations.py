@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import bump_version, get_version
+from recipes.models import FavoriteRecipe, ShoppingCart
+from users.models import Subscription
+
+# Имя набора: модель связи и поле с id связанного объекта.
+RELATIONS = {
+    'following': (Subscription, 'author_id'),
+    'favorites': (FavoriteRecipe, 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'recipe_id'),
+}
+
+
+def get_relations_namespace(name, user_id):
+    return f'relations:{name}:{user_id}'
+
+
+def invalidate_relations(name, user_id):
+    bump_version(get_relations_namespace(name, user_id))
+
+
+class UserRelations:
+    """
+    Связи пользователя для признаков is_subscribed, is_favorited
+    и is_in_shopping_cart.
+    Каждый набор id загружается одним запросом при первом обращении
+    и дальше проверяется без запросов к базе. Если задан
+    settings.RELATIONS_CACHE_TIMEOUT, наборы хранятся в кэше между
+    запросами; ключ включает версию набора пользователя, которую
+    сигналы меняют после записи Subscription, FavoriteRecipe или
+    ShoppingCart, поэтому устаревший набор не читается.
+    Attributes:
+        user: - пользователь запроса
+        sets: dict - загруженные наборы по именам из RELATIONS
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.sets = {}
+
+    def get(self, name):
+        if name not in self.sets:
+            self.sets[name] = self.load(name)
+
+        return self.sets[name]
+
+    def load(self, name):
+        if self.user.is_anonymous:
+            return frozenset()
+
+        timeout = settings.RELATIONS_CACHE_TIMEOUT
+
+        if timeout:
+            namespace = get_relations_namespace(name, self.user.pk)
+            key = f'{namespace}:{get_version(namespace)}'
+            ids = cache.get(key)
+
+            if ids is not None:
+                return ids
+
+        model, field = RELATIONS[name]
+        ids = frozenset(
+            model.objects.filter(user=self.user).values_list(field, flat=True)
+        )
+
+        if timeout:
+            cache.set(key, ids, timeout)
+
+        return ids
+
+    def contains(self, name, pk):
+        return pk in self.get(name)
+
+
+def get_relations(request):
+    """Связи пользователя, общие для всех сериализаторов запроса."""
+
+    relations = getattr(request, 'relations', None)
+
+    if relations is None or relations.user != request.user:
+        request.relations = UserRelations(request.user)
+
+    return request.relations
@@ -0,0 +1,302 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, Case, FloatField, When
+from django.db.models.expressions import RawSQL
+
+from .cache import INGREDIENTS_NAMESPACE, RECIPES_NAMESPACE, get_version
+from recipes.models import Ingredient, Recipe
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+TS_QUERY = "websearch_to_tsquery('russian'::regconfig, %s)"
+
+
+def get_trigrams(text):
+    """
+    Триграммы строки по правилам pg_trgm: каждое слово в нижнем
+    регистре дополняется двумя пробелами в начале и одним в конце.
+    """
+
+    trigrams = set()
+
+    for word in re.findall(r'[^\W_]+', text.lower()):
+        word = f'  {word} '
+        trigrams.update(
+            word[start:start + 3] for start in range(len(word) - 2)
+        )
+
+    return trigrams
+
+
+def order_by_ids(queryset, ids):
+    """Выборка объектов ids в порядке списка."""
+
+    if not ids:
+        return queryset.none()
+
+    return queryset.filter(pk__in=ids).order_by(
+        Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)])
+    )
+
+
+class IngredientIndex:
+    """
+    Индекс названий ингредиентов в памяти процесса.
+    Строится при первом обращении и перестраивается, когда сигналы
+    меняют версию INGREDIENTS_NAMESPACE в кэше. Поиск по индексу
+    не обращается к базе данных.
+    Attributes:
+        names: list - названия в нижнем регистре, отсортированные
+        для поиска по префиксу бинарным поиском
+        ingredients: list - ингредиенты в порядке names
+        trigrams: dict - триграмма: позиции ингредиентов в ingredients
+        trigram_counts: list - число триграмм каждого названия
+    """
+
+    def __init__(self):
+        self.version = None
+        self.names = []
+        self.ingredients = []
+        self.trigrams = {}
+        self.trigram_counts = []
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        version = get_version(INGREDIENTS_NAMESPACE)
+
+        if version == self.version:
+            return
+
+        with self.lock:
+            if version == self.version:
+                return
+
+            ingredients = sorted(
+                Ingredient.objects.all(),
+                key=lambda item: (item.name.lower(), item.pk)
+            )
+            trigrams = defaultdict(list)
+            trigram_counts = []
+
+            for position, ingredient in enumerate(ingredients):
+                name_trigrams = get_trigrams(ingredient.name)
+                trigram_counts.append(len(name_trigrams))
+
+                for trigram in name_trigrams:
+                    trigrams[trigram].append(position)
+
+            self.names = [item.name.lower() for item in ingredients]
+            self.ingredients = ingredients
+            self.trigrams = trigrams
+            self.trigram_counts = trigram_counts
+            self.version = version
+
+    def search(self, value):
+        """
+        Ингредиенты, содержащие value в названии.
+        Сначала идут названия, начинающиеся с value, затем остальные.
+        Если таких нет, value считается написанным с опечаткой
+        и ищутся похожие названия (см. fuzzy).
+        """
+
+        self.refresh()
+        names, ingredients = self.names, self.ingredients
+
+        if not value:
+            return list(ingredients)
+
+        value = value.lower()
+        position = bisect_left(names, value)
+        end = position
+
+        while end < len(names) and names[end].startswith(value):
+            end += 1
+
+        contains = [
+            ingredient
+            for name, ingredient in zip(names, ingredients)
+            if value in name and not name.startswith(value)
+        ]
+
+        return ingredients[position:end] + contains or self.fuzzy(value)
+
+    def fuzzy(self, value):
+        """
+        Ингредиенты с похожими названиями по убыванию сходства.
+        Сходство считается как в pg_trgm: доля общих триграмм,
+        отбрасываются названия со сходством ниже
+        settings.INGREDIENT_SIMILARITY_THRESHOLD.
+        """
+
+        self.refresh()
+        trigrams, counts = self.trigrams, self.trigram_counts
+        ingredients = self.ingredients
+        query = get_trigrams(value)
+        shared = defaultdict(int)
+
+        for trigram in query:
+            for position in trigrams.get(trigram, ()):
+                shared[position] += 1
+
+        scored = []
+
+        for position, common in shared.items():
+            similarity = common / (len(query) + counts[position] - common)
+
+            if similarity >= settings.INGREDIENT_SIMILARITY_THRESHOLD:
+                scored.append((-similarity, position))
+
+        return [ingredients[position] for _, position in sorted(scored)]
+
+
+ingredient_index = IngredientIndex()
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower().replace('ё', 'е'))
+
+
+class RecipeIndex:
+    """
+    Инвертированный индекс рецептов в памяти процесса.
+    Используется для поиска, когда база данных не PostgreSQL
+    (SQLite в режиме DEBUG). Строится по Recipe.search_document одним
+    запросом и перестраивается при смене версии RECIPES_NAMESPACE.
+    Слово запроса совпадает со всеми словами индекса, начинающимися
+    с него, что заменяет стемминг, но точное совпадение весит больше;
+    рецепт должен содержать все слова запроса. Слова из названия
+    весят больше слов из остального текста.
+    Attributes:
+        postings: dict - слово: {id рецепта: вес}
+        tokens: list - отсортированные слова индекса
+        max_results: int - сколько лучших рецептов возвращает поиск
+    """
+
+    name_weight = 2
+    prefix_factor = 0.5
+    max_results = 500
+
+    def __init__(self):
+        self.version = None
+        self.postings = {}
+        self.tokens = []
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        version = get_version(RECIPES_NAMESPACE)
+
+        if version == self.version:
+            return
+
+        with self.lock:
+            if version == self.version:
+                return
+
+            postings = defaultdict(lambda: defaultdict(int))
+
+            for recipe_id, name, document in Recipe.objects.values_list(
+                'id', 'name', 'search_document'
+            ).iterator():
+                for token in tokenize(name):
+                    postings[token][recipe_id] += self.name_weight - 1
+
+                for token in tokenize(document):
+                    postings[token][recipe_id] += 1
+
+            self.postings = postings
+            self.tokens = sorted(postings)
+            self.version = version
+
+    def match(self, term):
+        matched = defaultdict(int)
+        position = bisect_left(self.tokens, term)
+
+        while (
+            position < len(self.tokens)
+            and self.tokens[position].startswith(term)
+        ):
+            token = self.tokens[position]
+            factor = 1 if token == term else self.prefix_factor
+
+            for recipe_id, weight in self.postings[token].items():
+                matched[recipe_id] += weight * factor
+
+            position += 1
+
+        return matched
+
+    def search(self, value):
+        """id рецептов, содержащих все слова value, по убыванию веса."""
+
+        self.refresh()
+        scores = None
+
+        for term in tokenize(value):
+            matched = self.match(term)
+            scores = matched if scores is None else {
+                recipe_id: score + matched[recipe_id]
+                for recipe_id, score in scores.items()
+                if recipe_id in matched
+            }
+
+        if not scores:
+            return []
+
+        return sorted(
+            scores, key=lambda recipe_id: (-scores[recipe_id], -recipe_id)
+        )[:self.max_results]
+
+
+recipe_index = RecipeIndex()
+
+
+def search_recipes(queryset, value):
+    """
+    Полнотекстовый поиск рецептов с сортировкой по релевантности.
+    На PostgreSQL условие и ts_rank считаются по столбцу search_vector
+    с GIN-индексом, иначе используется recipe_index.
+    """
+
+    if connections[queryset.db].vendor == 'postgresql':
+        vector = f'{Recipe._meta.db_table}.search_vector'
+
+        return queryset.filter(
+            RawSQL(f'{vector} @@ {TS_QUERY}', [value], BooleanField())
+        ).annotate(
+            search_rank=RawSQL(
+                f'ts_rank({vector}, {TS_QUERY})', [value], FloatField()
+            )
+        ).order_by('-search_rank', '-pub_date')
+
+    return order_by_ids(queryset, recipe_index.search(value))
+
+
+def search_similar_ingredients(queryset, value):
+    """
+    Ингредиенты с названиями, похожими на value.
+    На PostgreSQL используется оператор % из pg_trgm с GIN-индексом
+    по триграммам названия, порог сходства задаёт параметр
+    pg_trgm.similarity_threshold (по умолчанию 0.3). На других базах
+    используется триграммный индекс ingredient_index.
+    """
+
+    if connections[queryset.db].vendor == 'postgresql':
+        name = f'{Ingredient._meta.db_table}.name'
+
+        return queryset.filter(
+            RawSQL(f'{name} %% %s', [value], BooleanField())
+        ).annotate(
+            similarity=RawSQL(
+                f'similarity({name}, %s)', [value], FloatField()
+            )
+        ).order_by('-similarity', 'name')
+
+    return order_by_ids(
+        queryset,
+        [ingredient.pk for ingredient in ingredient_index.fuzzy(value)]
+    )
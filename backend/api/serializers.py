@@ -1,27 +1,133 @@
-import base64
-
-from django.core.files.base import ContentFile
-from django.shortcuts import get_object_or_404
+import binascii
+import hashlib
+import io
+import os
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers, status
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 
+from .relations import get_relations
 from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
-                            Recipe, ShoppingCart, Tag)
+                            Recipe, ShoppingCart, ShoppingCartIngredient, Tag)
 from users.models import Subscription, User
 
 
 class Base64ImageField(serializers.ImageField):
     """Кодирование/декодирование изображения в/из формата Base64."""
 
+    chunk_size = 64 * 1024
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode(imgstr, format.split('/')[-1], format[5:])
 
         return super().to_internal_value(data)
 
+    def decode(self, imgstr, ext, content_type):
+        """
+        Декодирование base64 блоками.
+        Размер проверяется до декодирования, небольшие изображения
+        собираются в памяти, большие пишутся во временный файл,
+        как это делают обработчики загрузки Django. Файл называется
+        по sha256 содержимого, как в ContentAddressedStorage.
+        """
+
+        if re.search(r'\s', imgstr):
+            imgstr = ''.join(imgstr.split())
+
+        size = len(imgstr) * 3 // 4
+
+        if size > settings.IMAGE_MAX_UPLOAD_SIZE:
+            raise ValidationError(
+                'Размер изображения не должен превышать '
+                f'{settings.IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)} Мб!'
+            )
+
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            image = TemporaryUploadedFile('', content_type, 0, None)
+        else:
+            image = InMemoryUploadedFile(
+                io.BytesIO(), None, '', content_type, 0, None
+            )
+
+        digest = hashlib.sha256()
+        step = self.chunk_size * 4
+
+        try:
+            for start in range(0, len(imgstr), step):
+                chunk = binascii.a2b_base64(imgstr[start:start + step])
+                digest.update(chunk)
+                image.write(chunk)
+        except binascii.Error:
+            raise ValidationError('Некорректное изображение в base64!')
+
+        image.name = f'{digest.hexdigest()}.{ext.lower()}'
+        image.size = image.tell()
+        image.seek(0)
+
+        return image
+
+
+class ProfiledSerializerMixin:
+    """
+    Замер сериализации ответа для RequestProfilingMiddleware.
+    Время to_representation попадает в этап serialize профиля запроса;
+    вложенные сериализаторы и сериализатор, вызванный из другого,
+    входят во время внешнего и отдельно не считаются.
+    """
+
+    def to_representation(self, instance):
+        profile = getattr(self.context.get('request'), 'profile', None)
+
+        if profile is None:
+            return super().to_representation(instance)
+
+        with profile.measure('serialize'):
+            return super().to_representation(instance)
+
+
+class ImageRenditions(metaclass=serializers.SerializerMetaclass):
+    """Ссылки на уменьшенные копии изображения рецепта."""
+
+    image_renditions = serializers.SerializerMethodField()
+
+    def get_image_renditions(self, args):
+        """
+        Ссылка на каждую копию из settings.IMAGE_RENDITIONS,
+        пока копии строятся - ссылка на исходное изображение.
+        """
+
+        if not args.image:
+            return None
+
+        request = self.context.get('request')
+        names = args.image_renditions
+
+        if names.get('source') != args.image.name:
+            names = {}
+
+        urls = {}
+
+        for rendition in settings.IMAGE_RENDITIONS:
+            if rendition in names:
+                url = default_storage.url(names[rendition])
+            else:
+                url = args.image.url
+
+            urls[rendition] = (
+                request.build_absolute_uri(url) if request else url
+            )
+
+        return urls
+
 
 class IsSubscription(metaclass=serializers.SerializerMetaclass):
     """Отображение наличия/отсутствия подписки пользователем на автора."""
@@ -29,14 +135,12 @@ class IsSubscription(metaclass=serializers.SerializerMetaclass):
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, args):
-        request = self.context.get('request')
-
-        if request.user.is_anonymous:
-            return False
+        if hasattr(args, 'is_subscribed'):
+            return args.is_subscribed
 
-        return Subscription.objects.filter(
-            user=request.user, author__id=args.id
-        ).exists()
+        return get_relations(self.context.get('request')).contains(
+            'following', args.id
+        )
 
 
 class IsRecipe(metaclass=serializers.SerializerMetaclass):
@@ -46,36 +150,31 @@ class IsRecipe(metaclass=serializers.SerializerMetaclass):
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     def get_is_favorited(self, args):
-        request = self.context.get('request')
+        if hasattr(args, 'is_favorited'):
+            return args.is_favorited
 
-        if request.user.is_anonymous:
-            return False
-
-        return FavoriteRecipe.objects.filter(
-            user=request.user, recipe__id=args.id
-        ).exists()
+        return get_relations(self.context.get('request')).contains(
+            'favorites', args.id
+        )
 
     def get_is_in_shopping_cart(self, args):
-        request = self.context.get('request')
-
-        if request.user.is_anonymous:
-            return False
+        if hasattr(args, 'is_in_shopping_cart'):
+            return args.is_in_shopping_cart
 
-        return ShoppingCart.objects.filter(
-            user=request.user, recipe__id=args.id
-        ).exists()
+        return get_relations(self.context.get('request')).contains(
+            'shopping_cart', args.id
+        )
 
 
 class IsRecipeCount(metaclass=serializers.SerializerMetaclass):
-    """Отображение количества рецептов автора."""
+    """Отображение количества рецептов автора из счётчика User."""
 
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
-    def get_recipes_count(self, args):
-        return Recipe.objects.filter(author__id=args.id).count()
 
-
-class CustomUserSerializer(UserCreateSerializer, IsSubscription):
+class CustomUserSerializer(
+    ProfiledSerializerMixin, UserCreateSerializer, IsSubscription
+):
     """Кастомизация пользователя из Djoser."""
 
     class Meta:
@@ -100,19 +199,20 @@ class CustomUserSerializer(UserCreateSerializer, IsSubscription):
         return result
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
+class RecipeShortSerializer(
+    ProfiledSerializerMixin, serializers.ModelSerializer, ImageRenditions
+):
     """Мини-сериализатор рецептов."""
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class SubscribeSerializer(CustomUserSerializer, IsRecipeCount):
     """Отображение подписок."""
 
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
 
     class Meta(CustomUserSerializer.Meta):
         fields = CustomUserSerializer.Meta.fields + (
@@ -122,11 +222,14 @@ class SubscribeSerializer(CustomUserSerializer, IsRecipeCount):
     def get_recipes(self, args):
         request = self.context.get('request')
         context = {'request': request}
-        recipe_limit = request.query_params.get('recipe_limit')
-        queryset = args.recipes.all()
+        if hasattr(args, 'limited_recipes'):
+            queryset = args.limited_recipes
+        else:
+            recipe_limit = request.query_params.get('recipe_limit')
+            queryset = args.recipes.all()
 
-        if recipe_limit:
-            queryset = queryset[:int(recipe_limit)]
+            if recipe_limit:
+                queryset = queryset[:int(recipe_limit)]
 
         return RecipeShortSerializer(queryset, context=context, many=True).data
 
@@ -166,7 +269,7 @@ class SubscribeCreateSerializer(CustomUserSerializer):
         ).data
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """Тэг."""
 
     class Meta:
@@ -174,7 +277,9 @@ class TagSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(
+    ProfiledSerializerMixin, serializers.ModelSerializer
+):
     """Ингредиент."""
 
     class Meta:
@@ -215,9 +320,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         max_length=None,
         use_url=True,
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
+    tags = serializers.ListField(
+        child=serializers.IntegerField()
     )
     ingredients = IngredientsEditSerializer(
         many=True
@@ -229,31 +333,43 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         read_only_fields = ('author',)
 
     def validate(self, data):
-        ingredients = data['ingredients']
-        ingredient_list = []
+        if 'ingredients' in data:
+            ingredients = Ingredient.objects.in_bulk(
+                [items['id'] for items in data['ingredients']]
+            )
+            ingredient_list = []
 
-        for items in ingredients:
-            ingredient = get_object_or_404(Ingredient, id=items['id'])
+            for items in data['ingredients']:
+                ingredient = ingredients.get(items['id'])
 
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError(
-                    f'Ингредиент {ingredient} уже добавлен в рецепт!'
-                )
+                if ingredient is None:
+                    raise NotFound(
+                        f'Ингредиента с id {items["id"]} не существует!'
+                    )
 
-            ingredient_list.append(ingredient)
-        tags = data['tags']
+                if ingredient in ingredient_list:
+                    raise serializers.ValidationError(
+                        f'Ингредиент {ingredient} уже добавлен в рецепт!'
+                    )
 
-        if not tags:
-            raise serializers.ValidationError(
-                'Нужен хотя бы один тэг для рецепта!'
-            )
+                ingredient_list.append(ingredient)
 
-        for tag_name in tags:
-            if not Tag.objects.filter(name=tag_name).exists():
+        if 'tags' in data:
+            tags = Tag.objects.in_bulk(data['tags'])
+
+            if not data['tags']:
                 raise serializers.ValidationError(
-                    f'Тэга {tag_name} не существует!'
+                    'Нужен хотя бы один тэг для рецепта!'
                 )
 
+            for tag_id in data['tags']:
+                if tag_id not in tags:
+                    raise serializers.ValidationError(
+                        f'Тэга {tag_id} не существует!'
+                    )
+
+            data['tags'] = list(tags.values())
+
         return data
 
     def validate_cooking_time(self, cooking_time):
@@ -278,42 +394,134 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         return ingredients
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            if self.validated_data.get('image'):
+                self.validated_data['image'].close()
+
     def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            IngredientAmount.objects.create(
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
                 recipe=recipe,
                 ingredient_id=ingredient.get('id'),
                 amount=ingredient.get('amount'),
             )
+            for ingredient in ingredients
+        )
+
+    def update_ingredients(self, ingredients, recipe):
+        """
+        Сохранение разницы между текущим и новым составом рецепта.
+        Удалённые, изменённые и новые ингредиенты записываются
+        тремя запросами независимо от их количества, та же разница
+        применяется к итогам корзин, в которых лежит рецепт.
+        """
+
+        amounts = {
+            ingredient.get('id'): ingredient.get('amount')
+            for ingredient in ingredients
+        }
+        current = {
+            item.ingredient_id: item
+            for item in recipe.amount_ingredient.all()
+        }
+        delta = {
+            ingredient_id: (
+                amounts.get(ingredient_id, 0)
+                - getattr(current.get(ingredient_id), 'amount', 0)
+            )
+            for ingredient_id in amounts.keys() | current.keys()
+        }
+        removed = current.keys() - amounts.keys()
+        changed = [
+            item for ingredient_id, item in current.items()
+            if ingredient_id in amounts
+            and item.amount != amounts[ingredient_id]
+        ]
+
+        for item in changed:
+            item.amount = amounts[item.ingredient_id]
+
+        if removed:
+            IngredientAmount.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+
+        if changed:
+            IngredientAmount.objects.bulk_update(changed, ['amount'])
+
+        self.create_ingredients(
+            [
+                ingredient for ingredient in ingredients
+                if ingredient.get('id') not in current
+            ],
+            recipe
+        )
+        ShoppingCartIngredient.objects.add_amounts(
+            ShoppingCart.objects.filter(
+                recipe=recipe
+            ).values_list('user_id', flat=True),
+            delta
+        )
+
+    def is_same_image(self, instance, image):
+        """
+        Совпадает ли загруженное изображение с текущим.
+        Имя файла - хэш содержимого, поэтому сравниваются имена,
+        и неизменённое изображение не записывается заново.
+        """
 
+        return bool(
+            image and instance.image
+            and os.path.basename(instance.image.name) == image.name
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        recipe.update_search_document()
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        if self.is_same_image(instance, validated_data.get('image')):
+            validated_data.pop('image')
+
         if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            instance.ingredients.clear()
-            self.create_ingredients(ingredients, instance)
+            self.update_ingredients(
+                validated_data.pop('ingredients'), instance
+            )
 
         if 'tags' in validated_data:
             instance.tags.set(validated_data.pop('tags'))
 
+        # save() в super().update() выполняется и без изменённых полей
+        # рецепта: auto_now один раз обновляет updated_at, в том числе
+        # при изменении только ингредиентов или тегов.
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+
         return RecipeReadSerializer(
-            instance,
-            context={'request': self.context.get('request')}
+            Recipe.objects.for_reading(request.user).get(pk=instance.pk),
+            context={'request': request}
         ).data
 
 
-class RecipeReadSerializer(serializers.ModelSerializer, IsRecipe):
+class RecipeReadSerializer(
+    ProfiledSerializerMixin,
+    serializers.ModelSerializer,
+    IsRecipe,
+    ImageRenditions,
+):
     """Вывод рецептов/рецепта для чтения."""
 
     tags = TagSerializer(
@@ -342,12 +550,15 @@ class RecipeReadSerializer(serializers.ModelSerializer, IsRecipe):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time',
         )
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(
+    ProfiledSerializerMixin, serializers.ModelSerializer
+):
     """Добавления рецепта в избранное."""
 
     name = serializers.CharField(
@@ -365,7 +576,7 @@ class FavoriteSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = FavoriteRecipe
-        fields = '__all__'
+        fields = ('id', 'user', 'recipe', 'name', 'image', 'cooking_time')
         extra_kwargs = {
             'user': {'write_only': True},
             'recipe': {'write_only': True}
@@ -387,7 +598,6 @@ class ShoppingCartSerializer(FavoriteSerializer):
 
     class Meta(FavoriteSerializer.Meta):
         model = ShoppingCart
-        fields = '__all__'
         validators = [
             serializers.UniqueTogetherValidator(
                 queryset=model.objects.all(),
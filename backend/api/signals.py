@@ -0,0 +1,104 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import get_token_cache_key
+from .cache import (INGREDIENTS_NAMESPACE, RECIPES_NAMESPACE, TAGS_NAMESPACE,
+                    bump_version)
+from .relations import invalidate_relations
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
+                            Recipe, ShoppingCart, Tag)
+from users.models import Subscription, User
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipes(**kwargs):
+    """Сброс кэша рецептов при изменении рецептов и справочников."""
+
+    transaction.on_commit(lambda: bump_version(RECIPES_NAMESPACE))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    """Перестроение индекса ингредиентов при изменении справочника."""
+
+    transaction.on_commit(lambda: bump_version(INGREDIENTS_NAMESPACE))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(**kwargs):
+    """Смена ETag списка тегов при изменении справочника."""
+
+    transaction.on_commit(lambda: bump_version(TAGS_NAMESPACE))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_recipe_authors(update_fields=None, **kwargs):
+    """Сброс кэша рецептов при изменении данных автора."""
+
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+
+    transaction.on_commit(lambda: bump_version(RECIPES_NAMESPACE))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    """Выход из системы: токен удаляется из кэша авторизации."""
+
+    key = get_token_cache_key(instance.key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(instance, update_fields=None, **kwargs):
+    """
+    Сброс кэша авторизации пользователя.
+    Кэш хранит пользователя целиком, в том числе пароль и is_active,
+    поэтому сбрасывается при любом его изменении.
+    """
+
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+
+    keys = [
+        get_token_cache_key(key)
+        for key in Token.objects.filter(
+            user_id=instance.pk
+        ).values_list('key', flat=True)
+    ]
+
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def invalidate_user_relations(sender, instance, **kwargs):
+    """Смена версии набора связей пользователя в кэше."""
+
+    name = {
+        Subscription: 'following',
+        FavoriteRecipe: 'favorites',
+        ShoppingCart: 'shopping_cart',
+    }[sender]
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_relations(name, user_id))
@@ -0,0 +1,169 @@
+import base64
+
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
+                            Recipe, ShoppingCart, Tag)
+from users.models import Subscription, User
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES, PAGINATION_COUNT_STRATEGY='exact')
+class QueryCountTests(APITestCase):
+    """Количество запросов к базе не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color='#000000', slug=f'tag{number}'
+            )
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(10)
+        ]
+        authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password='password-123',
+            )
+            for number in range(4)
+        ]
+        cls.user = User.objects.create_user(
+            email='user@example.com',
+            username='user',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='password-123',
+        )
+
+        for number in range(12):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+            )
+            recipe.tags.set(tags[:2])
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(
+                    recipe=recipe, ingredient=ingredient, amount=10
+                )
+                for ingredient in ingredients[number % 5:number % 5 + 3]
+            )
+
+            if number % 3 == 0:
+                FavoriteRecipe.objects.create(user=cls.user, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+        for author in authors[:3]:
+            Subscription.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_queries_per_page(self, url, params, sizes, num):
+        for size in sizes:
+            with self.subTest(url=url, limit=size):
+                cache.clear()
+
+                with self.assertNumQueries(num):
+                    response = self.client.get(url, {**params, 'limit': size})
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), size)
+
+    def test_recipes_list_anonymous(self):
+        self.assert_queries_per_page('/api/recipes/', {}, (2, 6), 5)
+
+    def test_recipes_list_authenticated(self):
+        self.client.force_authenticate(self.user)
+        self.assert_queries_per_page('/api/recipes/', {}, (2, 6), 5)
+
+    def test_subscriptions(self):
+        self.client.force_authenticate(self.user)
+        self.assert_queries_per_page(
+            '/api/users/subscriptions/', {'recipe_limit': 2}, (1, 3), 3
+        )
+
+
+@override_settings(CACHES=TEST_CACHES, TOKEN_CACHE_TIMEOUT=300)
+class CounterTests(APITestCase):
+    """Сохранение устаревшего экземпляра не сбрасывает счётчики."""
+
+    def setUp(self):
+        cache.clear()
+        self.author, self.follower = (
+            User.objects.create_user(
+                email=f'{username}@example.com',
+                username=username,
+                first_name='Имя',
+                last_name='Фамилия',
+                password='password-123',
+            )
+            for username in ('author', 'follower')
+        )
+        self.token = Token.objects.create(user=self.author)
+
+    def test_set_password_keeps_followers_count(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.client.get('/api/users/me/')
+        Subscription.objects.create(user=self.follower, author=self.author)
+
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'password-123',
+            'new_password': 'new-password-456',
+        })
+
+        self.assertEqual(response.status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+        self.assertTrue(self.author.check_password('new-password-456'))
+
+
+@override_settings(CACHES=TEST_CACHES, FEED_TIMELINE_THRESHOLD=0)
+class CursorTests(APITestCase):
+    """Испорченный курсор даёт 404, а не ошибку сервера."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com',
+            username='user',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='password-123',
+        )
+
+    def test_invalid_cursors(self):
+        self.client.force_authenticate(self.user)
+        cursors = [
+            '[null, null]', '[1]', '{"a": 1}', '[[1], 2]',
+            '[true, 1]', '["not a date", 1]',
+        ]
+
+        for url in ('/api/recipes/', '/api/recipes/feed/'):
+            for value in cursors:
+                cursor = base64.urlsafe_b64encode(value.encode()).decode()
+
+                with self.subTest(url=url, cursor=value):
+                    response = self.client.get(
+                        url, {'pagination': 'cursor', 'cursor': cursor}
+                    )
+                    self.assertEqual(response.status_code, 404)
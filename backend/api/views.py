@@ -1,5 +1,7 @@
-from django.db.models import F, Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              Value)
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters import rest_framework
 from djoser.views import UserViewSet
@@ -9,11 +11,18 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
 
-from .filters import IngredientFilter, RecipeFilter
-from .paginations import LimitPagination
+from .cache import (INGREDIENTS_NAMESPACE, RECIPES_NAMESPACE, TAGS_NAMESPACE,
+                    AnonymousResponseCacheMixin, get_version)
+from .conditional import ConditionalGetMixin, make_etag
+from .exports import EXPORTERS, FILENAME, ExportContentNegotiation
+from .feed import filter_feed
+from .filters import POPULAR_ORDERING, IngredientFilter, RecipeFilter
+from .metrics import registry
+from .paginations import KeysetPaginationMixin, LimitPagination
 from .permissions import IsAuthorOrAdminOrReadOnly
-from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
-                            Recipe, ShoppingCart, Tag)
+from .search import ingredient_index
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            ShoppingCart, ShoppingCartIngredient, Tag)
 from .serializers import (CustomUserSerializer, FavoriteSerializer,
                           IngredientSerializer, RecipeCreateSerializer,
                           RecipeReadSerializer, ShoppingCartSerializer,
@@ -31,7 +40,7 @@ class CreateUserView(UserViewSet):
         return User.objects.all()
 
 
-class UsersViewSet(UserViewSet):
+class UsersViewSet(KeysetPaginationMixin, UserViewSet):
     """
     Создание/получение пользователей
     и
@@ -42,6 +51,7 @@ class UsersViewSet(UserViewSet):
     serializer_class = CustomUserSerializer
     permission_classes = (AllowAny,)
     pagination_class = LimitPagination
+    keyset_ordering = ('-id',)
     http_method_names = ['get', 'post', 'delete', 'head']
 
     def get_permissions(self):
@@ -80,7 +90,17 @@ class UsersViewSet(UserViewSet):
     @action(detail=False, permission_classes=[IsAuthorOrAdminOrReadOnly])
     def subscriptions(self, request):
         user = request.user
-        subscribe = User.objects.filter(idol__user=user)
+        subscribe = User.objects.filter(idol__user=user).annotate(
+            is_subscribed=Value(True, BooleanField()),
+        ).order_by('-id').prefetch_related(
+            Prefetch(
+                'recipes',
+                queryset=self.get_limited_recipes(
+                    request.query_params.get('recipe_limit')
+                ),
+                to_attr='limited_recipes',
+            )
+        )
         page = self.paginate_queryset(subscribe)
         serializer = SubscribeSerializer(
             page, many=True,
@@ -88,9 +108,26 @@ class UsersViewSet(UserViewSet):
 
         return self.get_paginated_response(serializer.data)
 
+    def get_limited_recipes(self, recipe_limit):
+        """
+        Рецепты авторов, не более recipe_limit на каждого автора.
+        Ограничение накладывается коррелированным подзапросом, поэтому
+        рецепты всех авторов страницы загружаются одним запросом.
+        """
+
+        if not recipe_limit:
+            return Recipe.objects.all()
+
+        return Recipe.objects.filter(
+            pk__in=Recipe.objects.filter(
+                author=OuterRef('author')
+            ).values('pk')[:int(recipe_limit)]
+        )
+
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Тэги."""
+    conditional_namespaces = (TAGS_NAMESPACE,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
@@ -98,18 +135,50 @@ class TagViewSet(viewsets.ModelViewSet):
     permission_classes = [AllowAny]
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Ингредиенты."""
+    conditional_namespaces = (INGREDIENTS_NAMESPACE,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (rest_framework.DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional(
+            self.list_ingredients, request, *args, **kwargs
+        )
+
+    def list_ingredients(self, request, *args, **kwargs):
+        if settings.INGREDIENT_INDEX_ENABLED:
+            ingredients = ingredient_index.search(
+                request.query_params.get('name')
+            )
+        else:
+            ingredients = self.filter_queryset(self.get_queryset())
+
+        serializer = self.get_serializer(
+            ingredients[:settings.INGREDIENT_SEARCH_LIMIT], many=True
+        )
+
+        return Response(serializer.data)
 
-class RecipesViewSet(viewsets.ModelViewSet):
+
+class RecipesViewSet(
+    ConditionalGetMixin,
+    AnonymousResponseCacheMixin,
+    KeysetPaginationMixin,
+    viewsets.ModelViewSet,
+):
     """Создание/удаление/вывод рецептов."""
 
+    conditional_namespaces = (RECIPES_NAMESPACE,)
+    conditional_actions = ('retrieve',)
+    cache_namespace = RECIPES_NAMESPACE
+    cache_query_params = (
+        'tags', 'author', 'page', 'limit', 'pagination', 'cursor', 'search',
+        'ordering',
+    )
     queryset = Recipe.objects.all()
     http_method_names = ['get', 'post', 'put', 'delete', 'patch']
     filter_backends = (rest_framework.DjangoFilterBackend,)
@@ -117,6 +186,79 @@ class RecipesViewSet(viewsets.ModelViewSet):
     pagination_class = LimitPagination
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
 
+    @property
+    def keyset_ordering(self):
+        if (
+            self.action == 'list'
+            and self.request.query_params.get('ordering') == 'popular'
+        ):
+            return POPULAR_ORDERING
+
+        return ('-pub_date', '-id')
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve', 'feed'):
+            return Recipe.objects.for_reading(self.request.user)
+
+        return Recipe.objects.annotate_user_flags(self.request.user)
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        """
+        Состояние рецепта для ETag.
+        Анонимный ответ зависит только от данных, поэтому используется
+        версия кэша рецептов без запроса к базе. Для пользователя
+        в ETag входят updated_at рецепта, уменьшенные копии изображения
+        (фоновая задача сохраняет их без изменения updated_at), данные
+        автора и признаки избранного, корзины и подписки, которые
+        читаются одним запросом;
+        Last-Modified не отдаётся, так как признаки меняются без
+        изменения рецепта.
+        """
+
+        user = request.user
+
+        if user.is_anonymous:
+            return super().get_conditional_state(request, *args, **kwargs)
+
+        try:
+            state = Recipe.objects.filter(
+                pk=kwargs['pk']
+            ).annotate_user_flags(user).annotate(
+                is_subscribed=Exists(
+                    Subscription.objects.filter(
+                        user=user, author=OuterRef('author')
+                    )
+                )
+            ).values_list(
+                'updated_at', 'image_renditions', 'author__username',
+                'author__email', 'author__first_name', 'author__last_name',
+                'is_favorited', 'is_in_shopping_cart', 'is_subscribed',
+            ).first()
+        except (TypeError, ValueError):
+            state = None
+
+        if state is None:
+            return None, None
+
+        return make_etag(
+            self.action, request.accepted_renderer.format, user.pk, state,
+            get_version(TAGS_NAMESPACE), get_version(INGREDIENTS_NAMESPACE)
+        ), None
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """
+        Рецепты авторов из подписок пользователя, от новых к старым.
+        Всегда с курсорной пагинацией: ответ {next, results}.
+        """
+
+        pagination = self.keyset_pagination_class()
+        queryset = filter_feed(self.get_queryset(), request, pagination)
+        page = pagination.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+
+        return pagination.get_paginated_response(serializer.data)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -219,28 +361,43 @@ class ShoppingCartView(views.APIView):
 
 
 class DownloadShoppingCartView(views.APIView):
-    """Скачивание списка покупок."""
+    """Скачивание списка покупок в формате из параметра ?format=."""
 
-    permission_classes = [IsAuthorOrAdminOrReadOnly, ]
+    permission_classes = [IsAuthenticated, ]
+    content_negotiation_class = ExportContentNegotiation
 
     def get(self, request):
-        items = IngredientAmount.objects.select_related('recipe', 'ingredient')
-        items = items.filter(recipe__shopping_cart__user=request.user)
+        exporter = EXPORTERS.get(request.query_params.get('format', 'txt'))
+
+        if exporter is None:
+            return Response(
+                {'error': f'Доступные форматы: {", ".join(EXPORTERS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        items = items.values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(
+        items = ShoppingCartIngredient.objects.filter(
+            user=request.user
+        ).values(
             name=F('ingredient__name'),
             units=F('ingredient__measurement_unit'),
-            total=Sum('amount'),
-        ).order_by('-total')
+            total=F('amount'),
+        ).order_by('-amount')
 
-        text = '\n'.join([
-            f"{item['name']} ({item['units']}) - {item['total']}"
-            for item in items
-        ])
-        filename = "foodgram_shopping_cart.txt"
-        response = HttpResponse(text, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename{filename}'
+        response = StreamingHttpResponse(
+            exporter.render(items.iterator()),
+            content_type=exporter.content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{FILENAME}.{exporter.extension}"'
+        )
 
         return response
+
+
+def metrics(request):
+    """Метрики приложения в текстовом формате Prometheus."""
+
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -39,6 +39,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -91,6 +93,71 @@ else:
     }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+# Сигналы удаляют токен из кэша только того процесса, который обработал
+# выход, смену пароля или блокировку. У LocMemCache кэш свой в каждом
+# воркере gunicorn, и остальные принимали бы удалённый токен ещё
+# TOKEN_CACHE_TIMEOUT с, поэтому по умолчанию токены кэшируются только
+# в общем кэше (Redis, Memcached). 0 - без кэша.
+TOKEN_CACHE_TIMEOUT = int(os.getenv(
+    'TOKEN_CACHE_TIMEOUT',
+    0 if CACHES['default']['BACKEND'].endswith('LocMemCache') else 300
+))
+# 0 - наборы подписок, избранного и корзины загружаются в каждом запросе.
+RELATIONS_CACHE_TIMEOUT = int(os.getenv('RELATIONS_CACHE_TIMEOUT', 300))
+
+PAGINATION_COUNT_STRATEGY = os.getenv('PAGINATION_COUNT_STRATEGY', 'exact')
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 60)
+)
+PAGINATION_EXACT_COUNT_THRESHOLD = int(
+    os.getenv('PAGINATION_EXACT_COUNT_THRESHOLD', 10000)
+)
+
+# Индекс ингредиентов хранится в памяти каждого процесса и перестраивается
+# по версии в кэше, поэтому при нескольких воркерах нужен общий кэш.
+INGREDIENT_INDEX_ENABLED = (
+    os.getenv('INGREDIENT_INDEX_ENABLED', default='True') == 'True'
+)
+
+# Список ингредиентов не разбит на страницы, поэтому ограничен сверху.
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+# Порог сходства для поиска с опечатками без PostgreSQL; на PostgreSQL
+# действует параметр pg_trgm.similarity_threshold.
+INGREDIENT_SIMILARITY_THRESHOLD = float(
+    os.getenv('INGREDIENT_SIMILARITY_THRESHOLD', 0.3)
+)
+
+# Популярность рецепта: сумма весов добавлений в избранное и корзины,
+# вес добавления убывает вдвое каждые POPULARITY_HALF_LIFE_HOURS часов,
+# добавления старше POPULARITY_WINDOW_DAYS дней не учитываются.
+POPULARITY_HALF_LIFE_HOURS = float(
+    os.getenv('POPULARITY_HALF_LIFE_HOURS', 72)
+)
+POPULARITY_WINDOW_DAYS = int(os.getenv('POPULARITY_WINDOW_DAYS', 30))
+POPULARITY_FAVORITE_WEIGHT = float(
+    os.getenv('POPULARITY_FAVORITE_WEIGHT', 1)
+)
+POPULARITY_CART_WEIGHT = float(os.getenv('POPULARITY_CART_WEIGHT', 2))
+
+# Лента подписок: при FEED_TIMELINE_THRESHOLD подписок и больше
+# страницы выбираются по объединённой ленте из FEED_TIMELINE_SIZE
+# последних рецептов, которая хранится в кэше FEED_TIMELINE_TIMEOUT с.
+FEED_TIMELINE_THRESHOLD = int(os.getenv('FEED_TIMELINE_THRESHOLD', 50))
+FEED_TIMELINE_SIZE = int(os.getenv('FEED_TIMELINE_SIZE', 500))
+FEED_TIMELINE_TIMEOUT = int(os.getenv('FEED_TIMELINE_TIMEOUT', 300))
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -132,7 +199,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_FILTER_BACKENDS': [
@@ -162,3 +229,57 @@ CORS_ORIGIN_ALLOW_ALL = True
 CORS_URLS_REGEX = r'^/api/.*$'
 
 FILENAME = 'shopping_cart.txt'
+
+IMAGE_MAX_UPLOAD_SIZE = int(
+    os.getenv('IMAGE_MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
+)
+IMAGE_RENDITIONS = {
+    'card': 480,
+    'detail': 960,
+    'retina': 1920,
+}
+IMAGE_RENDITION_FORMAT = os.getenv('IMAGE_RENDITION_FORMAT', 'WEBP')
+IMAGE_RENDITION_QUALITY = int(os.getenv('IMAGE_RENDITION_QUALITY', 80))
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', 2))
+
+PDF_FONT_PATH = os.getenv(
+    'PDF_FONT_PATH', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Доля запросов, для которых считаются SQL и время обработки
+# (заголовок Server-Timing и лог api.profiling): 0 - выключено, 1 - все.
+REQUEST_PROFILING_SAMPLE_RATE = float(
+    os.getenv('REQUEST_PROFILING_SAMPLE_RATE', 1.0 if DEBUG else 0.01)
+)
+# Сколько раз должен повториться один SQL-шаблон, чтобы считаться N+1.
+REQUEST_PROFILING_DUPLICATE_THRESHOLD = int(
+    os.getenv('REQUEST_PROFILING_DUPLICATE_THRESHOLD', 3)
+)
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', default='True') == 'True'
+# Общий каталог для срезов метрик воркеров gunicorn; без него /metrics/
+# показывает только процесс, который обработал запрос.
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRICS_WORKER_THREADS = int(os.getenv('METRICS_WORKER_THREADS', 1))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'profiling': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'api.profiling': {
+            'handlers': ['profiling'],
+            'level': os.getenv('REQUEST_PROFILING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -1,7 +1,11 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from api.views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # nginx не проксирует /metrics/, адрес доступен только внутри сети.
+    path('metrics/', metrics, name='metrics'),
     path('api/', include('api.urls', namespace='api'))
 ]
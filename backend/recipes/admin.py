@@ -1,7 +1,8 @@
 from django.contrib.admin import ModelAdmin, TabularInline, register
 
 from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
-                            Recipe, ShoppingCart, Tag)
+                            Recipe, ShoppingCart, ShoppingCartIngredient, Tag)
+from recipes.signals import get_amounts
 from recipes.strings import EMPTY
 
 
@@ -34,10 +35,37 @@ class IngredientAmountInline(TabularInline):
 class RecipeAdmin(ModelAdmin):
     """Настройки отображения таблицы с рецептами."""
 
-    list_display = ('name', 'author')
+    list_display = (
+        'name', 'author', 'favorites_count', 'in_carts_count', 'popularity'
+    )
     list_filter = ['author', 'name', 'tags']
     inlines = (IngredientAmountInline,)
 
+    def save_related(self, request, form, formsets, change):
+        """
+        Ингредиенты инлайна сохраняются после рецепта: затем
+        обновляется документ для поиска, а разница между прежним
+        и новым составом применяется к итогам корзин с рецептом,
+        как в RecipeCreateSerializer.update_ingredients.
+        """
+
+        recipe = form.instance
+        before = get_amounts(recipe.pk)
+        super().save_related(request, form, formsets, change)
+        after = get_amounts(recipe.pk)
+        ShoppingCartIngredient.objects.add_amounts(
+            ShoppingCart.objects.filter(
+                recipe=recipe
+            ).values_list('user_id', flat=True),
+            {
+                ingredient_id: (
+                    after.get(ingredient_id, 0) - before.get(ingredient_id, 0)
+                )
+                for ingredient_id in before.keys() | after.keys()
+            }
+        )
+        recipe.update_search_document()
+
 
 @register(FavoriteRecipe)
 class FavoriteRecipeAdmin(ModelAdmin):
@@ -52,3 +80,10 @@ class ShoppingCartAdmin(ModelAdmin):
     """Настройки отображения таблицы с корзиной покупок."""
     list_display = ('pk', 'user', 'recipe')
     empty_value_display = f'{EMPTY}'
+
+
+@register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(ModelAdmin):
+    """Настройки отображения таблицы с итогами корзин покупок."""
+    list_display = ('pk', 'user', 'ingredient', 'amount')
+    empty_value_display = f'{EMPTY}'
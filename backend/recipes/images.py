@@ -0,0 +1,103 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_PIPELINE_WORKERS,
+    thread_name_prefix='recipe-image',
+)
+
+
+def get_rendition_name(image_name, rendition):
+    """Путь уменьшенной копии: static/recipe/renditions/<имя>_<копия>.webp."""
+
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    extension = settings.IMAGE_RENDITION_FORMAT.lower()
+
+    return f'{directory}/renditions/{stem}_{rendition}.{extension}'
+
+
+def schedule_renditions(recipe):
+    """
+    Постановка построения копий в очередь после фиксации транзакции.
+    Очередь живёт в памяти процесса; задачи, потерянные при
+    перезапуске, достраивает команда build_renditions --missing.
+    """
+
+    image_name = recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(build_renditions, recipe.pk, image_name)
+    )
+
+
+def build_renditions(recipe_id, image_name):
+    """
+    Построение уменьшенных копий изображения рецепта.
+    Выполняется в пуле потоков вне обработки запроса: каждая копия из
+    settings.IMAGE_RENDITIONS вписывается в заданную ширину и
+    перекодируется в settings.IMAGE_RENDITION_FORMAT. Изображения
+    хранятся по хэшу содержимого, поэтому уже построенные копии
+    того же файла не строятся повторно. Имена копий сохраняются
+    в Recipe.image_renditions, только если изображение рецепта
+    за это время не сменилось.
+    """
+
+    try:
+        renditions = {'source': image_name}
+        missing = {}
+
+        for rendition, width in settings.IMAGE_RENDITIONS.items():
+            name = get_rendition_name(image_name, rendition)
+
+            if default_storage.exists(name):
+                renditions[rendition] = name
+            else:
+                missing[rendition] = width
+
+        if missing:
+            with default_storage.open(image_name) as image_file:
+                image = ImageOps.exif_transpose(Image.open(image_file))
+                mode = 'RGBA' if 'A' in image.getbands() else 'RGB'
+                image = image.convert(mode)
+
+        for rendition, width in missing.items():
+            copy = image.copy()
+            copy.thumbnail((width, width * 4))
+            buffer = io.BytesIO()
+            copy.save(
+                buffer,
+                settings.IMAGE_RENDITION_FORMAT,
+                quality=settings.IMAGE_RENDITION_QUALITY,
+            )
+            name = get_rendition_name(image_name, rendition)
+            saved_name = default_storage.save(
+                name, ContentFile(buffer.getvalue())
+            )
+
+            if saved_name != name:
+                # Ту же копию успела сохранить параллельная задача.
+                default_storage.delete(saved_name)
+
+            renditions[rendition] = name
+
+        recipe = Recipe.objects.filter(pk=recipe_id, image=image_name).first()
+
+        if recipe is not None:
+            recipe.image_renditions = renditions
+            recipe.save(update_fields=['image_renditions'])
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', image_name)
+    finally:
+        connections.close_all()
@@ -0,0 +1,49 @@
+from concurrent.futures import wait
+
+from django.core.management import BaseCommand
+
+from recipes.images import build_renditions, executor
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Построение уменьшенных копий изображений рецептов. Нужна для '
+        'рецептов, созданных до появления копий, и для задач, '
+        'потерянных при перезапуске сервера: очередь копий хранится '
+        'в памяти процесса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help=(
+                'Только рецепты, у которых копии не построены '
+                'для текущего изображения.'
+            ),
+        )
+
+    def get_images(self, missing):
+        """Пары (id рецепта, изображение) для построения копий."""
+
+        for pk, image, renditions in Recipe.objects.exclude(
+            image=''
+        ).exclude(image=None).values_list(
+            'pk', 'image', 'image_renditions'
+        ).iterator():
+            if not missing or renditions.get('source') != image:
+                yield pk, image
+
+    def handle(self, *args, **options):
+        images = list(self.get_images(options['missing']))
+        wait([
+            executor.submit(build_renditions, pk, image)
+            for pk, image in images
+        ])
+        failed = sum(1 for _ in self.get_images(missing=True))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Копии построены для {len(images) - failed} рецептов '
+            f'из {len(images)}, без копий осталось {failed}.'
+        ))
@@ -0,0 +1,86 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Удаление изображений, на которые не ссылается ни один рецепт'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, которые будут удалены.',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help=(
+                'Не трогать файлы моложе указанного числа секунд: '
+                'они могут принадлежать ещё не сохранённому рецепту.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        storage = field.storage
+        references = self.count_references()
+        threshold = timezone.now() - timedelta(seconds=options['min_age'])
+        removed = freed = 0
+
+        for name in self.walk(storage, field.upload_to.rstrip('/')):
+            if (
+                references[name]
+                or storage.get_modified_time(name) > threshold
+            ):
+                continue
+
+            removed += 1
+            freed += storage.size(name)
+
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Найдено" if options["dry_run"] else "Удалено"} '
+            f'файлов без ссылок: {removed}, {freed / 1024 / 1024:.1f} Мб'
+        ))
+
+    def count_references(self):
+        """Количество рецептов, ссылающихся на каждый файл."""
+
+        references = Counter(dict(
+            Recipe.objects.exclude(image='').values('image').annotate(
+                count=Count('id')
+            ).values_list('image', 'count')
+        ))
+
+        for renditions in Recipe.objects.values_list(
+            'image_renditions', flat=True
+        ).iterator():
+            for rendition, name in renditions.items():
+                if rendition != 'source':
+                    references[name] += 1
+
+        return references
+
+    def walk(self, storage, directory):
+        if not storage.exists(directory):
+            return
+
+        directories, files = storage.listdir(directory)
+
+        for name in files:
+            yield os.path.join(directory, name)
+
+        for name in directories:
+            yield from self.walk(storage, os.path.join(directory, name))
@@ -1,21 +1,146 @@
+import csv
 import json
+import os
+import time
+from contextlib import nullcontext
+from itertools import islice
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
+from api.cache import INGREDIENTS_NAMESPACE, RECIPES_NAMESPACE, bump_version
 from recipes.models import Ingredient
 
+CHUNK_SIZE = 64 * 1024
+
+
+def read_json(data_file):
+    """
+    Потоковое чтение json-массива объектов.
+    Файл читается блоками по CHUNK_SIZE, в памяти держится только
+    ещё не разобранный хвост блока.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = data_file.read(CHUNK_SIZE).lstrip()
+
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается json-массив объектов.')
+
+    buffer = buffer[1:]
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+
+        if buffer.startswith(']'):
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Файл с ингредиентами повреждён.')
+
+            chunk = data_file.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+
+        yield item
+        buffer = buffer[end:]
+
+
+def read_csv(data_file):
+    for name, measurement_unit in csv.reader(data_file):
+        yield {'name': name, 'measurement_unit': measurement_unit}
+
+
+READERS = {
+    '.json': read_json,
+    '.csv': read_csv,
+}
+
 
 class Command(BaseCommand):
-    help = 'Загрузка из csv файла'
+    help = 'Загрузка ингредиентов из json или csv файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default='data/ingredients.json',
+            help='Путь к файлу .json или .csv с ингредиентами.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество ингредиентов в одном INSERT.',
+        )
+        parser.add_argument(
+            '--atomic',
+            action='store_true',
+            help='Загрузить весь файл в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .json и .csv')
 
-    def handle(self, *args, **kwargs):
         self.stdout.write(self.style.WARNING('Старт команды'))
-        with open(
-            'data/ingredients.json',
-            encoding='utf-8',
-        ) as data_file_ingredients:
-            ingredient_data = json.loads(data_file_ingredients.read())
-            for ingredients in ingredient_data:
-                Ingredient.objects.get_or_create(**ingredients)
-
-        self.stdout.write(self.style.SUCCESS('Данные загружены'))
+        started = time.monotonic()
+        total = created = 0
+
+        with open(path, encoding='utf-8') as data_file, (
+            transaction.atomic() if options['atomic'] else nullcontext()
+        ):
+            rows = reader(data_file)
+
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+
+                if not batch:
+                    break
+
+                total += len(batch)
+                created += self.save_batch(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Обработано: {total}, добавлено: {created}, '
+                    f'{total / max(elapsed, 1e-6):.0f} строк/с'
+                )
+
+        bump_version(INGREDIENTS_NAMESPACE)
+        bump_version(RECIPES_NAMESPACE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные загружены: {created} новых из {total} '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
+
+    def save_batch(self, batch):
+        """
+        Добавление пачки ингредиентов двумя запросами.
+        Уже существующие пары (name, measurement_unit) пропускаются,
+        поэтому команду можно запускать повторно.
+        """
+
+        rows = {
+            (row['name'], row['measurement_unit']): row for row in batch
+        }
+        existing = set(
+            Ingredient.objects.filter(
+                name__in={name for name, _ in rows}
+            ).values_list('name', 'measurement_unit')
+        )
+        new_ingredients = [
+            Ingredient(**row)
+            for key, row in rows.items() if key not in existing
+        ]
+        Ingredient.objects.bulk_create(
+            new_ingredients, ignore_conflicts=True
+        )
+
+        return len(new_ingredients)
@@ -1,5 +1,6 @@
 from django.core.management import BaseCommand
 
+from api.cache import RECIPES_NAMESPACE, TAGS_NAMESPACE, bump_version
 from recipes.models import Tag
 
 
@@ -11,5 +12,9 @@ class Command(BaseCommand):
             {'name': 'Завтрак', 'color': '#E26C2D', 'slug': 'breakfast'},
             {'name': 'Обед', 'color': '#49B64E', 'slug': 'dinner'},
             {'name': 'Ужин', 'color': '#8775D2', 'slug': 'supper'}]
-        Tag.objects.bulk_create(Tag(**tag) for tag in data)
+        Tag.objects.bulk_create(
+            (Tag(**tag) for tag in data), ignore_conflicts=True
+        )
+        bump_version(TAGS_NAMESPACE)
+        bump_version(RECIPES_NAMESPACE)
         self.stdout.write(self.style.SUCCESS('Все тэги загружены!'))
@@ -0,0 +1,71 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Sum
+
+from recipes.models import IngredientAmount, ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт итогов корзин покупок по рецептам в корзинах'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить итоги с корзинами, ничего не меняя.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном INSERT.',
+        )
+
+    def handle(self, *args, **options):
+        expected = {
+            (row['user'], row['ingredient']): row['total']
+            for row in IngredientAmount.objects.filter(
+                recipe__shopping_cart__isnull=False
+            ).values(
+                'ingredient', user=F('recipe__shopping_cart__user')
+            ).annotate(total=Sum('amount')).iterator()
+        }
+
+        if options['check']:
+            stored = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount in
+                ShoppingCartIngredient.objects.values_list(
+                    'user_id', 'ingredient_id', 'amount'
+                ).iterator()
+            }
+            drift = {
+                key for key in expected.keys() | stored.keys()
+                if expected.get(key) != stored.get(key)
+            }
+
+            if drift:
+                raise CommandError(
+                    f'Итоги расходятся с корзинами в {len(drift)} строках.'
+                )
+
+            self.stdout.write(self.style.SUCCESS('Итоги корзин совпадают.'))
+            return
+
+        with transaction.atomic():
+            ShoppingCartIngredient.objects.all().delete()
+            ShoppingCartIngredient.objects.bulk_create(
+                (
+                    ShoppingCartIngredient(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=amount,
+                    )
+                    for (user_id, ingredient_id), amount in expected.items()
+                ),
+                batch_size=options['batch_size'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги корзин пересчитаны: {len(expected)} строк.'
+        ))
@@ -0,0 +1,82 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.signals import COUNTERS
+
+
+def count_related(model, link):
+    """Подзапрос с количеством строк model, ссылающихся на объект."""
+
+    field = link[:-len('_id')]
+
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчёт счётчиков recipes_count и followers_count '
+        'пользователей, favorites_count и in_carts_count рецептов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить счётчики с данными, ничего не меняя.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном UPDATE.',
+        )
+
+    def handle(self, *args, **options):
+        drift = {}
+
+        for related, (model, link, field) in COUNTERS.items():
+            drift[field] = (model, related, link, list(
+                model.objects.annotate(
+                    expected=count_related(related, link)
+                ).exclude(**{field: F('expected')}).values_list(
+                    'pk', flat=True
+                )
+            ))
+
+        total = sum(len(pks) for *_, pks in drift.values())
+
+        if options['check']:
+            if total:
+                raise CommandError(
+                    'Счётчики расходятся с данными: ' + ', '.join(
+                        f'{field} - {len(pks)}'
+                        for field, (*_, pks) in drift.items() if pks
+                    )
+                )
+
+            self.stdout.write(self.style.SUCCESS('Счётчики совпадают.'))
+            return
+
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            for field, (model, related, link, pks) in drift.items():
+                for start in range(0, len(pks), batch_size):
+                    model.objects.filter(
+                        pk__in=pks[start:start + batch_size]
+                    ).update(**{field: count_related(related, link)})
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны: исправлено {total} значений.'
+        ))
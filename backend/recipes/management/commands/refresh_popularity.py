@@ -0,0 +1,76 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.cache import RECIPES_NAMESPACE, bump_version
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчёт Recipe.popularity для ?ordering=popular по добавлениям '
+        'в избранное и корзины. Запускается по расписанию (cron), '
+        'запросы к API популярность не считают.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов в одном UPDATE.',
+        )
+
+    def get_scores(self, now):
+        """
+        Популярность рецептов с добавлениями за окно
+        POPULARITY_WINDOW_DAYS. Добавления читаются потоком по индексу
+        created, вес каждого - вес вида добавления, умноженный
+        на 0.5 ** (возраст / POPULARITY_HALF_LIFE_HOURS).
+        """
+
+        since = now - timedelta(days=settings.POPULARITY_WINDOW_DAYS)
+        half_life = settings.POPULARITY_HALF_LIFE_HOURS * 3600
+        scores = defaultdict(float)
+
+        for model, weight in (
+            (FavoriteRecipe, settings.POPULARITY_FAVORITE_WEIGHT),
+            (ShoppingCart, settings.POPULARITY_CART_WEIGHT),
+        ):
+            for recipe_id, created in model.objects.filter(
+                created__gte=since
+            ).values_list('recipe_id', 'created').iterator():
+                age = max((now - created).total_seconds(), 0)
+                scores[recipe_id] += weight * 0.5 ** (age / half_life)
+
+        return scores
+
+    def handle(self, *args, **options):
+        scores = self.get_scores(timezone.now())
+        current = dict(
+            Recipe.objects.filter(popularity__gt=0).values_list(
+                'pk', 'popularity'
+            ).iterator()
+        )
+        changed = [
+            Recipe(pk=pk, popularity=round(scores.get(pk, 0.0), 6))
+            for pk in scores.keys() | current.keys()
+            if round(scores.get(pk, 0.0), 6) != current.get(pk, 0.0)
+        ]
+
+        with transaction.atomic():
+            Recipe.objects.bulk_update(
+                changed, ['popularity'], batch_size=options['batch_size']
+            )
+
+        if changed:
+            bump_version(RECIPES_NAMESPACE)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярность пересчитана: {len(scores)} рецептов '
+            f'с добавлениями, изменено {len(changed)}.'
+        ))
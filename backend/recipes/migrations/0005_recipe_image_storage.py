@@ -0,0 +1,19 @@
+# Generated by Django 3.2 on 2026-10-17 04:48
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Здесь можно загрузить картинку, объёмом не более 5Мб', null=True, storage=recipes.storage.ContentAddressedStorage(), upload_to='static/recipe/', verbose_name='Изображение'),
+        ),
+    ]
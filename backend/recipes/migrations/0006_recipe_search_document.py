@@ -0,0 +1,65 @@
+# Generated by Django 3.2 on 2026-10-17 04:52
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+SEARCH_VECTOR_SQL = """
+ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector
+GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian'::regconfig, name), 'A')
+    || setweight(to_tsvector('russian'::regconfig, search_document), 'B')
+) STORED;
+CREATE INDEX recipe_search_vector ON recipes_recipe USING gin (search_vector);
+"""
+
+
+def fill_search_documents(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    ingredient_names = defaultdict(list)
+
+    for recipe_id, name in IngredientAmount.objects.values_list(
+        'recipe_id', 'ingredient__name'
+    ).iterator():
+        ingredient_names[recipe_id].append(name)
+
+    recipes = list(Recipe.objects.only('id', 'name', 'text'))
+
+    for recipe in recipes:
+        recipe.search_document = '\n'.join(
+            [recipe.name, *ingredient_names[recipe.pk], recipe.text]
+        )
+
+    Recipe.objects.bulk_update(recipes, ['search_document'], batch_size=500)
+
+
+def create_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_VECTOR_SQL)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe DROP COLUMN search_vector;'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Текст для поиска'),
+        ),
+        migrations.RunPython(
+            fill_search_documents, migrations.RunPython.noop
+        ),
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
@@ -1,11 +1,14 @@
+from collections import defaultdict
+
 from colorfield.fields import ColorField
 from django.core.validators import MinValueValidator
 from django.db import models
 from pytils.translit import slugify
 
 from recipes.constants import MAX_LENGTH
+from recipes.storage import ContentAddressedStorage
 from recipes.strings import MSG_LETTERS_RU, MSG_LETTERS_US, MSG_NUM
-from users.models import User
+from users.models import CountersMixin, Subscription, User
 
 
 class Tag(models.Model):
@@ -86,18 +89,111 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_unit',
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Запросы к рецептам с признаками для текущего пользователя."""
+
+    def annotate_user_flags(self, user):
+        """
+        Добавляет признаки is_favorited и is_in_shopping_cart.
+        Вычисляются подзапросами EXISTS в том же SQL-запросе,
+        что и сами рецепты, вместо отдельного запроса на каждый рецепт.
+        """
+
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(False, models.BooleanField()),
+                is_in_shopping_cart=models.Value(
+                    False, models.BooleanField()
+                ),
+            )
+
+        return self.annotate(
+            is_favorited=models.Exists(
+                FavoriteRecipe.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+        )
+
+    def for_reading(self, user):
+        """
+        Рецепты для сериализатора RecipeReadSerializer.
+        Автор с признаком is_subscribed, тэги и ингредиенты загружаются
+        через prefetch_related, поэтому количество запросов на страницу
+        не зависит от её размера.
+        """
+
+        if user.is_anonymous:
+            authors = User.objects.annotate(
+                is_subscribed=models.Value(False, models.BooleanField())
+            )
+        else:
+            authors = User.objects.annotate(
+                is_subscribed=models.Exists(
+                    Subscription.objects.filter(
+                        user=user, author=models.OuterRef('pk')
+                    )
+                )
+            )
+
+        return self.annotate_user_flags(user).prefetch_related(
+            models.Prefetch('author', queryset=authors),
+            'tags',
+            models.Prefetch(
+                'amount_ingredient',
+                queryset=IngredientAmount.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+    def refresh_search_documents(self):
+        """Пересборка search_document для рецептов выборки."""
+
+        recipes = list(self.only('id', 'name', 'text'))
+
+        if not recipes:
+            return
+
+        ingredient_names = defaultdict(list)
+
+        for recipe_id, name in IngredientAmount.objects.filter(
+            recipe__in=recipes
+        ).values_list('recipe_id', 'ingredient__name'):
+            ingredient_names[recipe_id].append(name)
+
+        for recipe in recipes:
+            recipe.search_document = recipe.build_search_document(
+                ingredient_names[recipe.pk]
+            )
+
+        self.model.objects.bulk_update(recipes, ['search_document'])
+
+
+class Recipe(CountersMixin, models.Model):
     """
     Модель таблицы рецепта.
     Attributes:
         author : ForeignKey - ссылка (ID) на объект класса User
         name: CharField - название рецепта
         image: ImageField - изображение рецепта
+        image_renditions: JSONField - пути уменьшенных копий изображения
         text: CharField - описание рецепта
         ingredients: ManyToManyField - ссылка на
         промежуточную модель ингредиентов
@@ -105,6 +201,15 @@ class Recipe(models.Model):
         cooking_time: PositiveSmallIntegerField - время приготовления
         (положительное число)
         pub_date: DateTimeField - дата создания
+        updated_at: DateTimeField - дата изменения, в том числе
+        ингредиентов и тегов; входит в ETag рецепта
+        search_document: TextField - название, ингредиенты и описание
+        для полнотекстового поиска
+        favorites_count: PositiveIntegerField - в скольких избранных
+        in_carts_count: PositiveIntegerField - в скольких корзинах
+        popularity: FloatField - популярность по недавним добавлениям
+        в избранное и корзины, пересчитывается командой
+        refresh_popularity
     """
 
     author = models.ForeignKey(
@@ -125,10 +230,17 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name="Изображение",
         upload_to="static/recipe/",
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True,
         help_text="Здесь можно загрузить картинку, объёмом не более 5Мб",
     )
+    image_renditions = models.JSONField(
+        verbose_name='Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name='Описание',
         help_text=(
@@ -162,15 +274,75 @@ class Recipe(models.Model):
         verbose_name='Дата создания рецепта',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения рецепта',
+        auto_now=True,
+    )
+    search_document = models.TextField(
+        verbose_name='Текст для поиска',
+        default='',
+        blank=True,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False,
+    )
+    popularity = models.FloatField(
+        verbose_name='Популярность',
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    COUNTER_FIELDS = ('favorites_count', 'in_carts_count', 'popularity')
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'], name='recipe_author_pub_date'
+            ),
+            models.Index(
+                fields=['-popularity', '-id'], name='recipe_popularity_id'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def build_search_document(self, ingredient_names):
+        return '\n'.join([self.name, *ingredient_names, self.text])
+
+    def update_search_document(self, ingredient_names=None):
+        """
+        Обновление search_document одним UPDATE без сигналов.
+        На PostgreSQL из него и названия строится столбец
+        search_vector с GIN-индексом (миграция 0006).
+        """
+
+        if ingredient_names is None:
+            ingredient_names = self.amount_ingredient.values_list(
+                'ingredient__name', flat=True
+            )
+
+        self.search_document = self.build_search_document(ingredient_names)
+        Recipe.objects.filter(pk=self.pk).update(
+            search_document=self.search_document
+        )
+
 
 class IngredientAmount(models.Model):
     """
@@ -228,6 +400,7 @@ class FavoriteRecipe(models.Model):
     Attributes:
         user: ForeignKey - ссылка (ID) на объект класса User
         recipe: ForeignKey - ссылка (ID) на объект класса Recipe
+        created: DateTimeField - дата добавления, для popularity
     """
 
     user = models.ForeignKey(
@@ -243,6 +416,11 @@ class FavoriteRecipe(models.Model):
         related_name='favorites',
         help_text='Введите Id любимого рецепта.',
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Список избранного'
@@ -263,6 +441,7 @@ class ShoppingCart(models.Model):
     Attributes:
         user: ForeignKey - ссылка (ID) на объект класса User
         recipe: ForeignKey - ссылка (ID) на объект класса Recipe
+        created: DateTimeField - дата добавления, для popularity
     """
 
     user = models.ForeignKey(
@@ -278,6 +457,11 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart',
         help_text='Введите Id рецепта который хотите добавить в корзину.',
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -290,3 +474,96 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
+
+
+class ShoppingCartIngredientQuerySet(models.QuerySet):
+    """Изменение итогов корзин покупок."""
+
+    def add_amounts(self, user_ids, amounts):
+        """
+        Прибавляет amounts ({id ингредиента: количество}) к итогам
+        корзин пользователей user_ids, количество может быть
+        отрицательным. Сначала создаются недостающие строки,
+        затем все строки меняются одним UPDATE с F(), поэтому
+        параллельные изменения одной корзины не теряются.
+        """
+
+        user_ids = list(user_ids)
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+
+        if not user_ids or not amounts:
+            return
+
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id, amount in amounts.items() if amount > 0
+            ),
+            ignore_conflicts=True,
+        )
+        rows = self.filter(user_id__in=user_ids, ingredient_id__in=amounts)
+        rows.update(
+            amount=models.F('amount') + models.Case(
+                *(
+                    models.When(ingredient_id=ingredient_id, then=amount)
+                    for ingredient_id, amount in amounts.items()
+                ),
+                output_field=models.IntegerField(),
+            )
+        )
+        rows.filter(amount__lte=0).delete()
+
+
+class ShoppingCartIngredient(models.Model):
+    """
+    Модель таблицы итогов корзины покупок.
+    Хранит суммарное количество каждого ингредиента по всем рецептам
+    корзины пользователя и обновляется при изменении корзины
+    и состава рецептов в ней.
+    Attributes:
+        user: ForeignKey - ссылка (ID) на объект класса User
+        ingredient: ForeignKey - ссылка (ID) на объект класса Ingredient
+        amount: IntegerField - суммарное количество ингредиента
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество',
+        default=0,
+    )
+
+    objects = ShoppingCartIngredientQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_ingredient',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-amount'],
+                name='cart_ingredient_user_amount',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} {self.amount}'
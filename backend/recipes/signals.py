@@ -0,0 +1,149 @@
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.images import schedule_renditions
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
+                            Recipe, ShoppingCart, ShoppingCartIngredient)
+from users.models import Subscription, User
+
+SEARCH_FIELDS = {'name', 'text'}
+
+# Модель связи: (модель со счётчиком, поле связи, счётчик).
+COUNTERS = {
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Subscription: (User, 'author_id', 'followers_count'),
+    FavoriteRecipe: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'in_carts_count'),
+}
+
+
+def get_amounts(recipe_id):
+    return dict(
+        IngredientAmount.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', 'amount')
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_cart_totals(instance, created, **kwargs):
+    """Добавление ингредиентов рецепта в итоги корзины."""
+
+    if created:
+        ShoppingCartIngredient.objects.add_amounts(
+            [instance.user_id], get_amounts(instance.recipe_id)
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_cart_totals(instance, **kwargs):
+    """
+    Вычитание ингредиентов рецепта из итогов корзины.
+    pre_delete срабатывает и при каскадном удалении рецепта,
+    пока его ингредиенты ещё не удалены.
+    """
+
+    amounts = get_amounts(instance.recipe_id)
+    ShoppingCartIngredient.objects.add_amounts(
+        [instance.user_id],
+        {ingredient_id: -amount for ingredient_id, amount in amounts.items()}
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def process_image(instance, update_fields=None, **kwargs):
+    """Построение уменьшенных копий нового изображения рецепта."""
+
+    if update_fields and set(update_fields) == {'image_renditions'}:
+        return
+
+    if (
+        instance.image
+        and instance.image_renditions.get('source') != instance.image.name
+    ):
+        schedule_renditions(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_document(instance, created, update_fields=None, **kwargs):
+    """
+    Обновление текста для поиска при изменении рецепта, один раз
+    на сохранение. Сериализатор меняет ингредиенты до сохранения
+    рецепта, поэтому документ строится уже по новому составу.
+    У нового рецепта ингредиентов ещё нет, их добавляет bulk_create,
+    и сериализатор обновляет документ после них сам; админка -
+    после сохранения инлайнов. Удаление рецепта документ не трогает.
+    """
+
+    if update_fields and not SEARCH_FIELDS & set(update_fields):
+        return
+
+    instance.update_search_document([] if created else None)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search_documents(instance, created, **kwargs):
+    """Переименованный ингредиент меняет документы его рецептов."""
+
+    if not created:
+        Recipe.objects.filter(
+            ingredients=instance
+        ).refresh_search_documents()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_tagged_recipes(instance, action, reverse, pk_set, **kwargs):
+    """
+    Изменение тегов меняет дату изменения рецептов.
+    Очистка обрабатывается до удаления связей, пока рецепты тега
+    ещё можно найти.
+    """
+
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if not reverse:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+    elif pk_set:
+        recipes = Recipe.objects.filter(pk__in=pk_set)
+    else:
+        recipes = Recipe.objects.filter(tags=instance)
+
+    recipes.update(updated_at=timezone.now())
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Изменение счётчика одним UPDATE с F(), без чтения и гонок между
+    запросами. Счётчик не уходит ниже нуля, если разошёлся с данными;
+    расхождения исправляет команда rebuild_counters.
+    """
+
+    objects = model.objects.filter(pk=pk)
+
+    if delta < 0:
+        objects = objects.filter(**{f'{field}__gte': -delta})
+
+    objects.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        model, link, field = COUNTERS[sender]
+        change_counter(model, getattr(instance, link), field, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_counter(sender, instance, **kwargs):
+    model, link, field = COUNTERS[sender]
+    change_counter(model, getattr(instance, link), field, -1)
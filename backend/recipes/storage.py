@@ -0,0 +1,47 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище файлов, названных по хэшу содержимого.
+    Файл сохраняется как <каталог>/<2 символа sha256>/<sha256>.<ext>,
+    поэтому одинаковое содержимое получает одно имя и повторная
+    загрузка того же файла не пишет его на диск второй раз.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+
+        for chunk in content.chunks():
+            digest.update(chunk)
+
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        hexdigest = digest.hexdigest()
+        name = os.path.join(
+            directory,
+            hexdigest[:2],
+            hexdigest + os.path.splitext(filename)[1].lower(),
+        )
+
+        try:
+            # Время изменения повторно использованного файла обновляется,
+            # чтобы cleanup_images --min-age не удалил его до сохранения
+            # рецепта, который на него сошлётся.
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            pass
+        else:
+            return name
+
+        temporary_name = super()._save(f'{name}.{uuid.uuid4().hex}', content)
+        os.replace(self.path(temporary_name), self.path(name))
+
+        return name
@@ -23,6 +23,8 @@ class UserAdmin(admin.ModelAdmin):
         'last_name',
         'date_joined',
         'is_active',
+        'recipes_count',
+        'followers_count',
         'password',
     )
     search_fields = (
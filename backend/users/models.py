@@ -3,7 +3,39 @@ from django.db import models
 from django.db.models import F, Q
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """
+    Счётчики из COUNTER_FIELDS меняются только UPDATE с F() в сигналах
+    и командах. Обычный save() существующей строки их не записывает,
+    иначе устаревший экземпляр (например, пользователь из кэша
+    токенов) вернул бы счётчикам значения на момент своей загрузки.
+    Attributes:
+        COUNTER_FIELDS: tuple - имена полей-счётчиков
+    """
+
+    COUNTER_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.attname for field in self._meta.concrete_fields
+                    if not field.primary_key
+                    and field.attname not in deferred
+                ]
+
+            kwargs['update_fields'] = [
+                name for name in update_fields
+                if name not in self.COUNTER_FIELDS
+            ]
+
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     """
     Модель таблицы пользователей.
     Attributes:
@@ -11,6 +43,8 @@ class User(AbstractUser):
         ограничение символов согласно тз
         first_name: CharField - переопределяем поле, выставляем
         ограничение символов согласно тз
+        recipes_count: PositiveIntegerField - количество рецептов
+        followers_count: PositiveIntegerField - количество подписчиков
     """
 
     email = models.EmailField(
@@ -22,9 +56,20 @@ class User(AbstractUser):
         max_length=150,
         verbose_name="Имя"
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
+    COUNTER_FIELDS = ('recipes_count', 'followers_count')
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -69,6 +114,11 @@ class Subscription(models.Model):
                 name='subscriber_not_author',
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='subscription_author_user'
+            ),
+        ]
 
     def __str__(self):
         return f'The {self.user} is subscribed to the {self.author}'